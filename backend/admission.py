@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator
+import functools
+import threading
+import asyncio
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+_ITEM, _ERROR, _DONE = object(), object(), object()
+
+
+class QueueFullError(Exception):
+    """Raised when a request is rejected because the query pool is saturated."""
+
+
+class QueryAdmission:
+    """
+    Runs blocking query work on a bounded worker pool with admission control.
+
+    At most max_concurrent calls execute at once; up to max_queued more wait for a
+    worker. Anything beyond that is rejected immediately with QueueFullError so
+    the API can answer 429 instead of piling up work. A slot is released when the
+    work finishes, even if the awaiting request was cancelled.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queued: int = 32):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="query")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of admitted calls that are running or queued."""
+        return self._pending
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, func: Callable[[], Any]):
+        with self._lock:
+            if self._pending >= self.max_concurrent + self.max_queued:
+                raise QueueFullError(f"{self._pending} queries in progress or queued")
+            self._pending += 1
+        try:
+            future = self.executor.submit(func)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) on the worker pool without blocking the event loop."""
+        future = self._submit(functools.partial(func, *args, **kwargs))
+        return await asyncio.wrap_future(future)
+
+    def stream(self, func: Callable[..., Iterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """
+        Iterate a blocking generator on the worker pool.
+
+        Admission is decided immediately, so QueueFullError is raised before any
+        response has been started. Items are handed to the event loop as the
+        generator produces them. If the consumer goes away, the generator is
+        stopped at its next item and the worker slot is released.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def put(item) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed
+                cancelled.set()
+
+        def produce() -> None:
+            try:
+                for item in func(*args, **kwargs):
+                    if cancelled.is_set():
+                        break
+                    put((_ITEM, item))
+            except BaseException as e:
+                put((_ERROR, e))
+            finally:
+                put((_DONE, None))
+
+        self._submit(produce)
+        return self._drain(queue, cancelled)
+
+    @staticmethod
+    async def _drain(queue: asyncio.Queue, cancelled: threading.Event) -> AsyncIterator[Any]:
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind is _DONE:
+                    return
+                if kind is _ERROR:
+                    raise value
+                yield value
+        finally:
+            cancelled.set()
+
+    def shutdown(self) -> None:
+        """Stop accepting work and wait for running calls."""
+        self.executor.shutdown(wait=True)
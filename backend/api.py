@@ -1,9 +1,22 @@
-from fastapi import FastAPI, UploadFile, File
-from pydantic import BaseModel
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel, Field
+import threading
+import asyncio
+import json
+import time
 import os
 import shutil
 import logging
+import zipfile
 from model import RAGModel
+from collection_manager import CollectionManager, DEFAULT_COLLECTION
+from admission import QueryAdmission, QueueFullError
+from jobs import IndexingJobs
+from sessions import SessionStore
+from manifest import SUPPORTED_EXTENSIONS
+from metrics import REQUEST_SECONDS
 from typing import List, Optional, Dict, Any
 
 app = FastAPI()
@@ -12,12 +25,26 @@ logger = logging.getLogger(__name__)
 
 class Question(BaseModel):
     text: str
+    # Collections to answer from; all collections when neither is given
+    collection: Optional[str] = None
+    collections: Optional[List[str]] = None
+    include_timings: bool = False
+    # Chat session the question belongs to; follow-ups are answered in its context
+    session_id: Optional[str] = Field(None, max_length=128)
+
+    def collection_names(self) -> Optional[List[str]]:
+        return self.collections or ([self.collection] if self.collection else None)
 
 class Answer(BaseModel):
     answer: str
     status: str
     sources: Optional[List[Dict[str, Any]]] = None
     error: Optional[str] = None
+    cached: bool = False
+    timings: Optional[Dict[str, float]] = None
+    context: Optional[Dict[str, int]] = None
+    # The question as used for retrieval, rewritten to stand alone within a session
+    query: Optional[str] = None
 
 # Initialize model with environment variables
 ollama_url = os.getenv("OLLAMA_URL", "http://localhost:11434")
@@ -29,49 +56,338 @@ os.makedirs(documents_dir, exist_ok=True)
 logger.info(f"Using DOCUMENTS_DIR: {documents_dir}")
 logger.info(f"Using OLLAMA_URL: {ollama_url}")
 
-model = RAGModel(data_dir=documents_dir, base_url=ollama_url)
+# "indexer" ingests documents and publishes index snapshots (and answers questions);
+# "query" replicas only answer, from the snapshots an indexer publishes on a shared volume
+role = os.getenv("ROLE", "indexer").lower()
+if role not in ("indexer", "query"):
+    raise ValueError(f"Unknown ROLE {role!r}; expected 'indexer' or 'query'")
+logger.info(f"Running as {role}")
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the model on startup."""
+# Settings shared by the models of all collections
+model_settings = dict(
+    base_url=ollama_url,
+    embed_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "32")),
+    embed_max_in_flight=int(os.getenv("EMBED_MAX_IN_FLIGHT", "4")),
+    answer_cache_size=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+    answer_cache_ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    answer_cache_similarity=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")),
+    question_cache_size=int(os.getenv("QUESTION_CACHE_SIZE", "1024")),
+    retrieval_cache_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", "4096")),
+    hybrid_search=os.getenv("HYBRID_SEARCH", "true").lower() == "true",
+    index_spec=os.getenv("FAISS_INDEX_SPEC", "Flat"),
+    vector_storage=os.getenv("VECTOR_STORAGE", "float32"),
+    nprobe=int(os.getenv("FAISS_NPROBE", "8")),
+    ef_search=int(os.getenv("FAISS_EF_SEARCH", "64")),
+    loader_workers=int(os.getenv("LOADER_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    snapshots_kept=int(os.getenv("INDEX_SNAPSHOTS_KEPT", "3")),
+    context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")),
+    rerank=os.getenv("RERANK", "true").lower() == "true",
+    rerank_fetch_k=int(os.getenv("RERANK_FETCH_K", "50")),
+    rerank_cutoff=float(os.getenv("RERANK_CUTOFF", "0.5")),
+    rerank_min_score=float(os.getenv("RERANK_MIN_SCORE", "0.5")),
+    query_batch_window_ms=float(os.getenv("QUERY_BATCH_WINDOW_MS", "0")),
+    query_batch_size=int(os.getenv("QUERY_BATCH_SIZE", "32")),
+    chunk_tokens=int(os.getenv("CHUNK_TOKENS", "256")),
+    chunk_overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "32")),
+    condense_followups=os.getenv("CONDENSE_FOLLOWUPS", "true").lower() == "true",
+    session_reuse_similarity=float(os.getenv("SESSION_REUSE_SIMILARITY", "0.9")),
+    # Replicas share the indexer's volume; they read snapshots and the embedding cache but never write there
+    read_only=role == "query",
+)
+
+# One index per subdirectory of DOCUMENTS_DIR, loaded on demand
+collections = CollectionManager(
+    documents_dir,
+    os.getenv("VECTOR_STORE_PATH", "/app/vector_store"),
+    lambda **kwargs: RAGModel(**model_settings, **kwargs),
+    max_loaded=int(os.getenv("MAX_LOADED_COLLECTIONS", "8")),
+    embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+)
+
+# Questions run on a bounded worker pool sized to what Ollama can serve in parallel
+query_admission = QueryAdmission(
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_QUERIES", "4")),
+    max_queued=int(os.getenv("MAX_QUEUED_QUERIES", "32")),
+)
+
+# Chat history per session ID, so clients send only the new message
+sessions = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+    max_turns=int(os.getenv("SESSION_MAX_TURNS", "5")),
+    ttl=float(os.getenv("SESSION_TTL", "86400")),
+    spill_dir=os.getenv("SESSION_SPILL_DIR") or None,
+    shared=os.getenv("SESSION_SHARED", "false").lower() == "true",
+)
+
+# Readiness of the index, reported by /ready
+readiness = {"status": "starting", "error": None}
+
+def run_indexing(progress, files: List[str]) -> Dict[str, Any]:
+    """Index the collections of pending uploads; also becomes ready if startup found no documents."""
+    report = collections.ingest_files(files, progress)
+    if readiness["status"] == "error" and collections.indexed_names():
+        readiness.update(status="ready", error=None)
+    return report
+
+# Uploads are indexed by one background worker; close uploads share an index update
+indexing_jobs = IndexingJobs(
+    run_indexing,
+    coalesce_window=float(os.getenv("INDEX_COALESCE_SECONDS", "2")),
+)
+
+def initialize_model() -> None:
+    """Bring every collection's index up to date and initialize the QA chains."""
     try:
-        # Load documents and initialize QA chain
-        model.load_and_process_documents()  # Removed 'await'
-        model.initialize_qa_chain()
+        for name in collections.names():
+            # Collections whose index matches their documents are only loaded
+            collections.ingest(name)
+        if not collections.indexed_names():
+            raise ValueError("Vector store not initialized. Please load documents first.")
+        readiness["status"] = "ready"
         logger.info("Model initialization completed")
     except Exception as e:
+        readiness["status"] = "error"
+        readiness["error"] = str(e)
         logger.error(f"Error during startup: {str(e)}")
-        raise
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload a file to the documents directory."""
+def initialize_replica() -> None:
+    """Load the published snapshots without touching the documents or the index."""
     try:
-        file_path = os.path.join(documents_dir, file.filename)
+        names = collections.indexed_names()
+        for name in names[:collections.max_loaded]:
+            collections.get(name)
+        if not names:
+            raise ValueError("No index published yet. Waiting for the indexer.")
+        readiness.update(status="ready", error=None)
+        logger.info(f"Loaded published snapshots of {len(names)} collection(s)")
+    except Exception as e:
+        readiness["status"] = "error"
+        readiness["error"] = str(e)
+        logger.error(f"Error during startup: {str(e)}")
+
+stop_watching = threading.Event()
+
+def watch_snapshots(interval: float) -> None:
+    """Poll the CURRENT pointers and hot-load snapshots the indexer publishes."""
+    while not stop_watching.wait(interval):
+        try:
+            changed = collections.refresh()
+            if changed:
+                logger.info(f"Reloaded collections: {', '.join(changed)}")
+            if readiness["status"] != "ready" and collections.indexed_names():
+                initialize_replica()
+        except Exception as e:
+            logger.error(f"Error reloading published snapshots: {str(e)}")
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize the model in the background so the server starts immediately."""
+    if role == "query":
+        asyncio.get_running_loop().run_in_executor(None, initialize_replica)
+        threading.Thread(
+            target=watch_snapshots,
+            args=(float(os.getenv("INDEX_POLL_SECONDS", "2")),),
+            name="snapshot-watcher",
+            daemon=True,
+        ).start()
+    else:
+        asyncio.get_running_loop().run_in_executor(None, initialize_model)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Wait for in-flight questions before exiting, then keep the chat sessions on disk."""
+    stop_watching.set()
+    query_admission.shutdown()
+    sessions.flush()
+
+@app.get("/ready")
+async def ready():
+    """Report whether the index is loaded and questions can be answered."""
+    if readiness["status"] != "ready":
+        return JSONResponse(status_code=503, content=readiness)
+    return {"status": "ready", "collections": collections.indexed_names()}
+
+@app.get("/collections")
+async def list_collections():
+    """Collections with an index, and the chunk counts of those loaded in memory."""
+    loaded = collections.loaded()
+    return {
+        name: {
+            "loaded": name in loaded and loaded[name].vector_store is not None,
+            "chunks": loaded[name].vector_store.index.ntotal
+            if name in loaded and loaded[name].vector_store is not None else None,
+        }
+        for name in collections.indexed_names()
+    }
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Cache hit/miss counters per loaded collection: the answer cache, for tuning the
+    similarity threshold, and the question embedding and retrieval caches.
+    """
+    return {name: model.cache_stats() for name, model in collections.loaded().items()}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage ingestion and query latency histograms."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def save_upload(file: UploadFile, collection: Optional[str] = None) -> List[str]:
+    """
+    Write an uploaded file, or the supported files inside an uploaded zip, into
+    the directory of a collection (the documents directory for the default one).
+
+    Returns:
+        List[str]: Paths of the written files relative to the documents directory.
+    """
+    collection = collection or DEFAULT_COLLECTION
+    target_dir = collections.data_dir_for(collection)
+    # The collection's directory may be named differently, see collection_name
+    prefix = "" if collection == DEFAULT_COLLECTION else os.path.basename(target_dir) + "/"
+    os.makedirs(target_dir, exist_ok=True)
+    filename = os.path.basename(file.filename or "")
+    if filename.lower().endswith(".zip"):
+        saved = []
+        with zipfile.ZipFile(file.file) as archive:
+            for member in archive.infolist():
+                name = os.path.normpath(member.filename)
+                if member.is_dir() or not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                if os.path.isabs(name) or name.startswith(".."):
+                    logger.warning(f"Skipping unsafe path in archive: {member.filename}")
+                    continue
+                target = os.path.join(target_dir, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with archive.open(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                saved.append(prefix + name.replace(os.sep, "/"))
+        return saved
+
+    with open(os.path.join(target_dir, filename), "wb") as f:
+        shutil.copyfileobj(file.file, f)
+    return [prefix + filename]
 
-        # Save the uploaded file
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+def require_valid_collection(name: Optional[str]) -> None:
+    """Reject a malformed collection name with HTTP 400."""
+    if name is not None:
+        try:
+            collections.validate_name(name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
+def require_indexed_collections(names: Optional[List[str]]) -> None:
+    """Reject a question naming a malformed (HTTP 400) or unindexed (HTTP 404) collection."""
+    for name in names or []:
+        require_valid_collection(name)
+        if name not in collections.loaded() and not collections.is_indexed(name):
+            raise HTTPException(status_code=404, detail=f"Collection {name!r} has no indexed documents")
+
+def require_indexer() -> None:
+    """Reject writes on query replicas; they never change the documents or the index."""
+    if role != "indexer":
+        raise HTTPException(status_code=403, detail="This replica is read-only. Send uploads to the indexer.")
+
+@app.post("/upload")
+async def upload_file(file: UploadFile = File(...), collection: Optional[str] = Query(None)):
+    """Upload a file into a collection (default: "default") and wait until it is indexed."""
+    require_indexer()
+    require_valid_collection(collection)
+    try:
+        rel_path = (await asyncio.get_running_loop().run_in_executor(None, save_upload, file, collection))[0]
+        file_path = os.path.join(documents_dir, rel_path)
         logger.info(f"File uploaded successfully: {file_path}")
 
-        # Re-process the documents after upload
-        model.load_and_process_documents()  # Removed 'await'
+        # Re-process the documents through the indexing worker without blocking the event loop
+        job_id = indexing_jobs.submit([rel_path])
+        job = await asyncio.get_running_loop().run_in_executor(None, indexing_jobs.wait, job_id)
+
+        if job["status"] == "failed":
+            return {"error": job.get("error"), "file_path": file_path}
+        parse_error = job.get("failed", {}).get(rel_path)
+        if parse_error:
+            return {"error": f"File uploaded but could not be parsed: {parse_error}", "file_path": file_path}
 
         return {"message": "File uploaded successfully", "file_path": file_path}
     except Exception as e:
         logger.error(f"Error uploading file: {str(e)}")
         return {"error": str(e)}
 
+@app.post("/upload/bulk", status_code=202)
+async def upload_files(files: List[UploadFile] = File(...), collection: Optional[str] = Query(None)):
+    """
+    Upload several files and/or zip archives into a collection and index them in
+    the background. Folders inside a zip uploaded to the default collection
+    become collections of their own.
+
+    Returns a job ID immediately; poll /jobs/{job_id} for progress.
+    """
+    require_indexer()
+    require_valid_collection(collection)
+    try:
+        saved = []
+        for file in files:
+            saved.extend(await asyncio.get_running_loop().run_in_executor(None, save_upload, file, collection))
+        logger.info(f"Bulk upload saved {len(saved)} files")
+    except Exception as e:
+        logger.error(f"Error uploading files: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job_id = indexing_jobs.submit(saved)
+    return {"job_id": job_id, "files": saved}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report the status and progress of an indexing job."""
+    job = indexing_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+def answer_question(question: Question) -> Dict[str, Any]:
+    session = sessions.get(question.session_id) if question.session_id else None
+    result = collections.get_answer(question.text, question.collection_names(), session)
+    if session is not None:
+        sessions.save(session)
+    return result
+
+def stream_question(question: Question):
+    session = sessions.get(question.session_id) if question.session_id else None
+    try:
+        yield from collections.stream_answer(question.text, question.collection_names(), session)
+    finally:
+        if session is not None:
+            sessions.save(session)
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget the history of a chat session."""
+    await asyncio.get_running_loop().run_in_executor(None, sessions.delete, session_id)
+    return {"status": "deleted"}
 
 @app.post("/ask", response_model=Answer)
 async def ask_question(question: Question):
-    """Handle questions and return answers."""
+    """
+    Handle questions and return answers.
+
+    Set include_timings to get the seconds spent per query stage in the response,
+    and session_id to answer follow-ups within a chat.
+    """
+    require_indexed_collections(question.collection_names())
+    started = time.perf_counter()
+    try:
+        result = await query_admission.run(answer_question, question)
+    except QueueFullError as e:
+        logger.warning(f"Rejecting question, query pool saturated: {str(e)}")
+        raise HTTPException(status_code=429, detail="Too many concurrent questions, please retry.",
+                            headers={"Retry-After": "1"})
+    REQUEST_SECONDS.labels("/ask").observe(time.perf_counter() - started)
+
     try:
-        result = model.get_answer(question.text)
         sources_metadata = []
 
-        if result["sources"]:
+        if result.get("sources"):
             for doc in result["sources"]:
                 sources_metadata.append(doc.metadata)  # Extract metadata
 
@@ -79,7 +395,11 @@ async def ask_question(question: Question):
             answer=result["answer"],
             status=result["status"],
             sources=sources_metadata,  # Return serialized metadata
-            error=result.get("error")
+            error=result.get("error"),
+            cached=result.get("cached", False),
+            timings=result.get("timings") if question.include_timings else None,
+            context=result.get("context"),
+            query=result.get("query"),
         )
     except Exception as e:
         logger.error(f"Error processing question: {str(e)}")
@@ -88,3 +408,31 @@ async def ask_question(question: Question):
             status="error",
             error=str(e)
         )
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(question: Question):
+    """
+    Stream the answer to a question as newline-delimited JSON.
+
+    The first event carries the retrieved sources, followed by one event per
+    generated token and a final "done" (or "error") event.
+    """
+    require_indexed_collections(question.collection_names())
+    try:
+        events = query_admission.stream(stream_question, question)
+    except QueueFullError as e:
+        logger.warning(f"Rejecting question, query pool saturated: {str(e)}")
+        raise HTTPException(status_code=429, detail="Too many concurrent questions, please retry.",
+                            headers={"Retry-After": "1"})
+
+    started = time.perf_counter()
+
+    async def ndjson():
+        try:
+            async for event in events:
+                yield json.dumps(event, default=str) + "\n"
+        finally:
+            REQUEST_SECONDS.labels("/ask/stream").observe(time.perf_counter() - started)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
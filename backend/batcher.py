@@ -0,0 +1,78 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.results: Optional[List[Any]] = None
+        self.error: Optional[BaseException] = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent blocking calls into batches.
+
+    Query workers call submit() with a key and an item. The first caller for a
+    key opens a batch and waits up to window_ms for others to join, or until
+    max_batch items have arrived; it then runs fn once over all items and hands
+    every caller its own result. Callers with different keys (for example,
+    searches against different indexes) are never batched together. There is no
+    background thread: the caller that opened a batch does the work.
+    """
+
+    def __init__(self, fn: Callable[[Hashable, List[Any]], List[Any]], window_ms: float = 5.0,
+                 max_batch: int = 32):
+        """
+        Args:
+            fn (Callable[[Hashable, List[Any]], List[Any]]): Processes a batch of items for a
+                key and returns one result per item, in order.
+            window_ms (float): How long the first caller waits for others. 0 disables batching.
+            max_batch (int): Items after which a batch is run without waiting further.
+        """
+        self.fn = fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._open: Dict[Hashable, _Batch] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, item: Any) -> Any:
+        """Process item as part of a batch and return its result; raises what fn raised."""
+        if self.window <= 0 or self.max_batch == 1:
+            return self.fn(key, [item])[0]
+
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            position = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch:
+                # Later callers start a new batch
+                del self._open[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            try:
+                batch.results = self.fn(key, batch.items)
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[position]
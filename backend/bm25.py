@@ -0,0 +1,373 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+import logging
+import json
+import math
+import os
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Keeps identifiers such as error codes, hostnames and dotted Java class names whole
+TOKEN_RE = re.compile(r"[a-z0-9_]+(?:[.\-:/][a-z0-9_]+)*")
+PART_RE = re.compile(r"[.\-:/]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase and split text into terms.
+
+    Compound identifiers (``java.lang.OutOfMemoryError``, ``app-01.prod``,
+    ``ERR-1042``) are kept as one term and additionally split into their parts,
+    so both the exact identifier and its components match.
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        parts = PART_RE.split(token)
+        if len(parts) > 1:
+            terms.extend(p for p in parts if p)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked ID lists with reciprocal rank fusion.
+
+    Each list contributes 1 / (k + rank) for every ID it contains.
+
+    Returns:
+        List[Tuple[str, float]]: IDs ordered by fused score, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class _BM25Search:
+    """Query side shared by the editable and the memory-mapped BM25 index."""
+
+    k1: float
+    b: float
+    total_len: int
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def _doc_lengths(self) -> np.ndarray:
+        """Length of the chunk in every slot; 0 for removed slots."""
+        raise NotImplementedError
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Slots of the chunks containing a term and its frequency in each."""
+        raise NotImplementedError
+
+    def _chunk_id(self, slot: int) -> str:
+        raise NotImplementedError
+
+    def _slot_of(self, chunk_id: str) -> Optional[int]:
+        raise NotImplementedError
+
+    def _scores(self, query: str) -> Optional[np.ndarray]:
+        """BM25 score of every slot for a query, or None if the index is empty."""
+        n_docs = len(self)
+        if not n_docs:
+            return None
+        doc_lens = self._doc_lengths()
+        avg_len = self.total_len / n_docs or 1.0
+
+        scores = np.zeros(len(doc_lens), dtype=np.float32)
+        for term in set(tokenize(query)):
+            compiled = self._term_postings(term)
+            if compiled is None:
+                continue
+            slots, tf = compiled
+            idf = math.log(1.0 + (n_docs - len(slots) + 0.5) / (len(slots) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_lens[slots] / avg_len)
+            scores[slots] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """
+        Return the k best-scoring chunks for a query.
+
+        Returns:
+            List[Tuple[str, float]]: (chunk_id, BM25 score), best first.
+        """
+        scores = self._scores(query)
+        if scores is None:
+            return []
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(self._chunk_id(int(slot)), float(scores[slot])) for slot in candidates]
+
+    def score(self, query: str, chunk_ids: List[str]) -> np.ndarray:
+        """BM25 scores of the given chunks for a query; 0 for chunks not in the index."""
+        scores = self._scores(query)
+        result = np.zeros(len(chunk_ids), dtype=np.float32)
+        if scores is None:
+            return result
+        for i, chunk_id in enumerate(chunk_ids):
+            slot = self._slot_of(chunk_id)
+            if slot is not None:
+                result[i] = scores[slot]
+        return result
+
+
+class BM25Index(_BM25Search):
+    """
+    In-process BM25 index over chunk texts with sparse postings.
+
+    Each term maps to the slots of the chunks containing it and their term
+    frequencies. Postings are compiled into NumPy arrays on first use, so a query
+    only touches the postings of its own terms. Chunks can be added and removed
+    incrementally; removed slots are reclaimed when the index is compacted.
+
+    This is the editable form used while ingestion changes a snapshot. It is
+    saved as flat arrays that published snapshots serve memory-mapped through
+    MappedBM25Index.
+    """
+
+    TERMS_FILE = "bm25.terms.npy"
+    SLOTS_FILE = "bm25.slots.npy"
+    TF_FILE = "bm25.tf.npy"
+    DOCS_FILE = "bm25.docs.npy"
+    LOOKUP_FILE = "bm25.lookup.npy"
+    PARAMS_FILE = "bm25.params.json"
+    # Written by earlier releases; read once into an editable index
+    JSON_FILE = "bm25.json"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._reset()
+
+    def _reset(self) -> None:
+        self.chunk_ids: List[Optional[str]] = []
+        self.doc_terms: List[Optional[Dict[str, int]]] = []
+        self.doc_lens: List[int] = []
+        self.slots: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_len = 0
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_len_array: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def add(self, chunk_id: str, text: str) -> None:
+        """Index a chunk, replacing any previous text stored under the same ID."""
+        if chunk_id in self.slots:
+            self.remove([chunk_id])
+        terms: Dict[str, int] = {}
+        for term in tokenize(text):
+            terms[term] = terms.get(term, 0) + 1
+        self._add_terms(chunk_id, terms)
+
+    def _add_terms(self, chunk_id: str, terms: Dict[str, int]) -> None:
+        slot = len(self.chunk_ids)
+        length = sum(terms.values())
+        self.chunk_ids.append(chunk_id)
+        self.doc_terms.append(terms)
+        self.doc_lens.append(length)
+        self.slots[chunk_id] = slot
+        self.total_len += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[slot] = tf
+            self._compiled.pop(term, None)
+        self._doc_len_array = None
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        """Remove chunks from the index. Unknown IDs are ignored."""
+        for chunk_id in chunk_ids:
+            slot = self.slots.pop(chunk_id, None)
+            if slot is None:
+                continue
+            for term in self.doc_terms[slot]:
+                postings = self.postings[term]
+                del postings[slot]
+                if not postings:
+                    del self.postings[term]
+                self._compiled.pop(term, None)
+            self.total_len -= self.doc_lens[slot]
+            self.chunk_ids[slot] = None
+            self.doc_terms[slot] = None
+            self.doc_lens[slot] = 0
+        if len(self.chunk_ids) > 2 * max(len(self.slots), 1024):
+            self.compact()
+
+    def compact(self) -> None:
+        """Renumber slots to drop the space held by removed chunks."""
+        live = [(cid, terms) for cid, terms in zip(self.chunk_ids, self.doc_terms) if cid is not None]
+        self._reset()
+        for chunk_id, terms in live:
+            self._add_terms(chunk_id, terms)
+
+    def copy(self) -> "BM25Index":
+        """Return an independent copy that can be modified without affecting this index."""
+        other = BM25Index(self.k1, self.b)
+        other.chunk_ids = list(self.chunk_ids)
+        other.doc_terms = list(self.doc_terms)
+        other.doc_lens = list(self.doc_lens)
+        other.slots = dict(self.slots)
+        other.postings = {term: dict(postings) for term, postings in self.postings.items()}
+        other.total_len = self.total_len
+        other._compiled = dict(self._compiled)
+        return other
+
+    def _doc_lengths(self) -> np.ndarray:
+        if self._doc_len_array is None:
+            self._doc_len_array = np.asarray(self.doc_lens, dtype=np.float32)
+        return self._doc_len_array
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self.postings.get(term)
+            if not postings:
+                return None
+            compiled = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+    def _chunk_id(self, slot: int) -> str:
+        return self.chunk_ids[slot]
+
+    def _slot_of(self, chunk_id: str) -> Optional[int]:
+        return self.slots.get(chunk_id)
+
+    def save(self, directory: str) -> None:
+        """
+        Write the index into directory as flat arrays: a term table sorted by
+        term with each term's offset into the postings, the postings' slots and
+        term frequencies, and the ID and length of the chunk in every slot, plus
+        an ID lookup table sorted by ID. Removed slots are dropped. The parameters
+        file goes last, so an index whose parameters file exists is complete.
+        """
+        live = [slot for slot, cid in enumerate(self.chunk_ids) if cid is not None]
+        renumber = np.zeros(len(self.chunk_ids), dtype=np.int64)
+        renumber[live] = np.arange(len(live))
+
+        ids = [self.chunk_ids[slot].encode("utf-8") for slot in live]
+        id_width = max((len(i) for i in ids), default=1)
+        docs = np.zeros(len(ids), dtype=[("id", f"S{id_width}"), ("length", "<f4")])
+        docs["id"], docs["length"] = ids, [self.doc_lens[slot] for slot in live]
+        order = np.argsort(docs["id"], kind="stable")
+        lookup = np.zeros(len(ids), dtype=[("id", f"S{id_width}"), ("slot", "<i8")])
+        lookup["id"], lookup["slot"] = docs["id"][order], order
+
+        # Sorted as str, which matches the byte order of their UTF-8 encoding
+        terms = sorted(self.postings)
+        counts = np.fromiter((len(self.postings[t]) for t in terms), dtype=np.int64, count=len(terms))
+        encoded = [t.encode("utf-8") for t in terms]
+        table = np.zeros(len(terms), dtype=[("term", f"S{max((len(t) for t in encoded), default=1)}"),
+                                            ("offset", "<i8")])
+        table["term"], table["offset"] = encoded, np.cumsum(counts) - counts
+        total = int(counts.sum())
+        slots = renumber[np.fromiter((s for t in terms for s in self.postings[t]), dtype=np.int64, count=total)]
+        tf = np.fromiter((f for t in terms for f in self.postings[t].values()), dtype=np.float32, count=total)
+
+        np.save(os.path.join(directory, self.TERMS_FILE), table)
+        np.save(os.path.join(directory, self.SLOTS_FILE), slots.astype("<i4"))
+        np.save(os.path.join(directory, self.TF_FILE), tf)
+        np.save(os.path.join(directory, self.DOCS_FILE), docs)
+        np.save(os.path.join(directory, self.LOOKUP_FILE), lookup)
+        path = os.path.join(directory, self.PARAMS_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "total_len": self.total_len}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional[Union["BM25Index", "MappedBM25Index"]]:
+        """
+        Open the index stored in directory memory-mapped, or return None if there
+        is none. An index saved as JSON by an earlier release is read into an
+        editable index instead.
+        """
+        if os.path.exists(os.path.join(directory, cls.PARAMS_FILE)):
+            return MappedBM25Index(directory)
+        path = os.path.join(directory, cls.JSON_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data.get("k1", 1.5), data.get("b", 0.75))
+        for chunk_id, terms in data["docs"]:
+            index._add_terms(chunk_id, terms)
+        return index
+
+
+class MappedBM25Index(_BM25Search):
+    """
+    Read-only BM25 index memory-mapped from the arrays BM25Index.save writes.
+
+    Opening it costs the same regardless of corpus size: terms and chunk IDs are
+    found by binary search in their sorted tables, a query reads only the
+    postings of its own terms, and processes serving the same snapshot share the
+    pages through the OS page cache. copy() returns an editable BM25Index.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, BM25Index.PARAMS_FILE), "r", encoding="utf-8") as f:
+            params = json.load(f)
+        self.k1, self.b, self.total_len = params["k1"], params["b"], params["total_len"]
+        self.terms = np.load(os.path.join(directory, BM25Index.TERMS_FILE), mmap_mode="r")
+        self.slots = np.load(os.path.join(directory, BM25Index.SLOTS_FILE), mmap_mode="r")
+        self.tf = np.load(os.path.join(directory, BM25Index.TF_FILE), mmap_mode="r")
+        self.docs = np.load(os.path.join(directory, BM25Index.DOCS_FILE), mmap_mode="r")
+        self.lookup = np.load(os.path.join(directory, BM25Index.LOOKUP_FILE), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _doc_lengths(self) -> np.ndarray:
+        return self.docs["length"]
+
+    def _term_range(self, i: int) -> Tuple[int, int]:
+        end = int(self.terms["offset"][i + 1]) if i + 1 < len(self.terms) else len(self.slots)
+        return int(self.terms["offset"][i]), end
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        key = term.encode("utf-8")
+        if not len(self.terms) or len(key) > self.terms.dtype["term"].itemsize:
+            return None
+        i = int(np.searchsorted(self.terms["term"], key))
+        if i == len(self.terms) or self.terms["term"][i] != key:
+            return None
+        start, end = self._term_range(i)
+        return self.slots[start:end], self.tf[start:end]
+
+    def _chunk_id(self, slot: int) -> str:
+        return self.docs["id"][slot].decode("utf-8")
+
+    def _slot_of(self, chunk_id: str) -> Optional[int]:
+        key = chunk_id.encode("utf-8")
+        if not len(self.lookup) or len(key) > self.lookup.dtype["id"].itemsize:
+            return None
+        i = int(np.searchsorted(self.lookup["id"], key))
+        if i < len(self.lookup) and self.lookup["id"][i] == key:
+            return int(self.lookup["slot"][i])
+        return None
+
+    def copy(self) -> BM25Index:
+        """Read the whole index into an editable BM25Index, e.g. to apply an update to it."""
+        terms = [term.decode("utf-8") for term in self.terms["term"]]
+        counts = np.diff(np.append(self.terms["offset"], len(self.slots)))
+        doc_terms: List[Dict[str, int]] = [{} for _ in range(len(self.docs))]
+        for term, slot, tf in zip(np.repeat(np.arange(len(terms)), counts).tolist(),
+                                  self.slots.tolist(), self.tf.tolist()):
+            doc_terms[slot][terms[term]] = int(tf)
+        index = BM25Index(self.k1, self.b)
+        for chunk_id, terms in zip(self.docs["id"], doc_terms):
+            index._add_terms(chunk_id.decode("utf-8"), terms)
+        return index
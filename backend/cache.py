@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+import threading
+import logging
+import time
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TTLLRUCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        """
+        Args:
+            maxsize (int): Maximum number of entries before the least recently used is evicted.
+            ttl (Optional[float]): Seconds an entry stays valid. None disables expiry.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value and mark it as recently used."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (self.ttl is None or item[0] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Insert or refresh an entry, evicting the least recently used ones if full."""
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Return the live entries without touching their recency."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (expires, _) in self._data.items() if expires <= now]
+            for k in expired:
+                del self._data[k]
+            return [(k, v) for k, (_, v) in self._data.items()]
+
+    def clear(self) -> None:
+        """Drop every entry. Hit/miss counters are kept."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def quantize(embedding: List[float], levels: int = 127) -> bytes:
+    """
+    Cache key for an embedding: its norm to 3 decimals and its direction rounded to int8.
+
+    Vectors that differ only by floating point noise share a key, while the
+    step (about 1/levels per component) is far smaller than the distance
+    between genuinely different questions.
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    direction = np.round(vector / (norm or 1.0) * levels).astype(np.int8)
+    return f"{norm:.3f}".encode("ascii") + b":" + direction.tobytes()
+
+
+class AnswerCache:
+    """
+    Two-tier cache of answers in front of the QA chain.
+
+    The exact tier is keyed on the normalized question text. The semantic tier
+    compares the question embedding against the embeddings of cached questions
+    and returns the answer of the closest one if its cosine similarity reaches
+    similarity_threshold. Both tiers use TTL and LRU eviction, and both are
+    cleared when the vector store changes. Entries are also scoped, e.g. to the
+    index version and collections they were answered from, and only match
+    lookups with the same scope.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 3600.0, similarity_threshold: float = 0.95):
+        """
+        Args:
+            maxsize (int): Entries per tier. 0 disables the cache.
+            ttl (Optional[float]): Seconds an answer stays valid.
+            similarity_threshold (float): Minimum cosine similarity for a semantic hit.
+                0 disables the semantic tier.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.exact = TTLLRUCache(maxsize, ttl)
+        self.semantic = TTLLRUCache(maxsize, ttl)
+        self.semantic_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exact.maxsize > 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.enabled and self.similarity_threshold > 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+    def get(self, question: str, embed: Callable[[str], List[float]] = None,
+            scope: str = "") -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        Look up a question in both tiers.
+
+        Args:
+            question (str): The user's question.
+            embed (Callable): Embeds the question for the semantic tier. Only called
+                on an exact-tier miss.
+            scope (str): Only entries stored under this scope match.
+
+        Returns:
+            Tuple[Optional[Dict[str, Any]], Optional[List[float]]]: the cached result
+            (or None) and the question embedding if one was computed, so the caller
+            can reuse it for retrieval.
+        """
+        if not self.enabled:
+            return None, None
+        key = (scope, self.normalize(question))
+        result = self.exact.get(key)
+        if result is not None or not self.semantic_enabled or embed is None:
+            return result, None
+
+        embedding = embed(question)
+        entries = [e for e in self.semantic.items() if e[0][0] == scope]
+        if entries:
+            query = np.asarray(embedding, dtype=np.float32)
+            matrix = np.stack([e[1][0] for e in entries])
+            similarities = matrix @ (query / (np.linalg.norm(query) or 1.0))
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                self.semantic_hits += 1
+                # Refresh recency of the matched entry
+                self.semantic.get(entries[best][0])
+                return entries[best][1][1], embedding
+        return None, embedding
+
+    def put(self, question: str, result: Dict[str, Any], embedding: Optional[List[float]] = None,
+            scope: str = "") -> None:
+        """Cache a successful result under the question text and, if given, its embedding."""
+        if not self.enabled:
+            return
+        key = (scope, self.normalize(question))
+        self.exact.put(key, result)
+        if self.semantic_enabled and embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            self.semantic.put(key, (vector / (np.linalg.norm(vector) or 1.0), result))
+
+    def clear(self) -> None:
+        """Invalidate both tiers."""
+        self.exact.clear()
+        self.semantic.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per tier, for tuning the similarity threshold."""
+        lookups = self.exact.hits + self.exact.misses
+        misses = self.exact.misses - self.semantic_hits
+        return {
+            "enabled": self.enabled,
+            "similarity_threshold": self.similarity_threshold,
+            "lookups": lookups,
+            "exact_hits": self.exact.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": misses,
+            "hit_rate": (lookups - misses) / lookups if lookups else 0.0,
+            "exact_size": len(self.exact),
+            "semantic_size": len(self.semantic),
+        }
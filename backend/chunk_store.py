@@ -0,0 +1,231 @@
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Union
+import numpy as np
+import logging
+import shutil
+import mmap
+import json
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ChunkStore(Docstore):
+    """
+    Read-only, offset-indexed store of chunk texts and metadata on disk.
+
+    Chunks are kept in the order of their vectors in the FAISS index. The data
+    file holds one JSON record per chunk; a position table maps each vector
+    position to its chunk ID and byte range, and a second table sorted by ID
+    resolves IDs with a binary search. All three files are memory-mapped, so
+    opening a store costs the same regardless of corpus size, only chunks that
+    retrieval returns are decoded, and processes reading the same snapshot share
+    its pages through the OS page cache.
+
+    Records are never rewritten in place. A new snapshot hard-links the data
+    file of the snapshot it was derived from and appends only the chunks that
+    are new; older snapshots keep reading their own byte ranges of the same file.
+    The file is rewritten from scratch once less than compact_ratio of it is
+    still referenced.
+
+    Positions whose vectors the index could not remove (HNSW) are tombstones:
+    they have an empty ID and no record, are listed in a tombstone table, and
+    are skipped by index_to_docstore_id.
+    """
+
+    DATA_FILE = "chunks.bin"
+    POSITIONS_FILE = "chunks.positions.npy"
+    LOOKUP_FILE = "chunks.lookup.npy"
+    TOMBSTONES_FILE = "chunks.tombstones.npy"
+    compact_ratio = 0.5
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.positions = np.load(os.path.join(directory, self.POSITIONS_FILE), mmap_mode="r")
+        self.lookup = np.load(os.path.join(directory, self.LOOKUP_FILE), mmap_mode="r")
+        tombstones_path = os.path.join(directory, self.TOMBSTONES_FILE)
+        # Snapshots written before tombstones existed have none
+        self.tombstones = np.load(tombstones_path) if os.path.exists(tombstones_path) else np.zeros(0, dtype=np.int64)
+        path = os.path.join(directory, self.DATA_FILE)
+        self._data = b""
+        if os.path.getsize(path):
+            with open(path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index_to_docstore_id = PositionIds(self.positions, len(self.tombstones))
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return all(os.path.exists(os.path.join(directory, name))
+                   for name in (cls.DATA_FILE, cls.POSITIONS_FILE, cls.LOOKUP_FILE))
+
+    @classmethod
+    def open(cls, directory: str) -> Optional["ChunkStore"]:
+        """Open the store in directory, or return None if there is none."""
+        return cls(directory) if cls.exists(directory) else None
+
+    @classmethod
+    def write(cls, directory: str, chunk_ids: List[Optional[str]], lookup: Callable[[str], Document],
+              base: Optional["ChunkStore"] = None) -> None:
+        """
+        Write the chunks with the given IDs, in vector order, into directory.
+
+        Args:
+            directory (str): Snapshot directory to write to.
+            chunk_ids (List[Optional[str]]): Chunk IDs by vector position; None marks a tombstone.
+            lookup (Callable[[str], Document]): Returns the chunk for an ID not held by base.
+            base (Optional[ChunkStore]): Store of the previous snapshot. Chunk IDs are
+                derived from content, so chunks it holds are reused without re-encoding.
+
+        The tables are written after the data file, so a store whose tables
+        exist is complete.
+        """
+        data_path = os.path.join(directory, cls.DATA_FILE)
+        reused = {}
+        if base is not None:
+            for chunk_id in chunk_ids:
+                position = base.position_of(chunk_id) if chunk_id is not None else None
+                if position is not None:
+                    row = base.positions[position]
+                    reused[chunk_id] = (int(row["offset"]), int(row["length"]))
+            base_path = os.path.join(base.directory, cls.DATA_FILE)
+            live, size = sum(length for _, length in reused.values()), os.path.getsize(base_path)
+            if not live or live < cls.compact_ratio * size:
+                if size:
+                    logger.info(f"Compacting chunk store: {live} of {size} bytes still referenced")
+                reused = {}
+            else:
+                cls._link(base_path, data_path)
+
+        ids, offsets, lengths = [], [], []
+        # A linked data file is shared with older snapshots and must only be appended to
+        with open(data_path, "ab" if reused else "wb") as f:
+            offset = f.tell()
+            for chunk_id in chunk_ids:
+                if chunk_id is None:
+                    ids.append(b"")
+                    offsets.append(0)
+                    lengths.append(0)
+                    continue
+                if chunk_id in reused:
+                    start, length = reused[chunk_id]
+                else:
+                    doc = lookup(chunk_id)
+                    record = json.dumps({"text": doc.page_content, "metadata": doc.metadata},
+                                        ensure_ascii=False).encode("utf-8")
+                    f.write(record)
+                    start, length = offset, len(record)
+                    offset += length
+                ids.append(chunk_id.encode("utf-8"))
+                offsets.append(start)
+                lengths.append(length)
+            f.flush()
+            os.fsync(f.fileno())
+
+        id_width = max((len(i) for i in ids), default=1)
+        positions = np.zeros(len(ids), dtype=[("id", f"S{id_width}"), ("offset", "<i8"), ("length", "<i8")])
+        positions["id"], positions["offset"], positions["length"] = ids, offsets, lengths
+        tombstones = np.flatnonzero(positions["id"] == b"")
+        order = np.argsort(positions["id"], kind="stable")[len(tombstones):]
+        lookup = np.zeros(len(order), dtype=[("id", f"S{id_width}"), ("position", "<i8")])
+        lookup["id"], lookup["position"] = positions["id"][order], order
+        np.save(os.path.join(directory, cls.TOMBSTONES_FILE), tombstones.astype(np.int64))
+        np.save(os.path.join(directory, cls.POSITIONS_FILE), positions)
+        np.save(os.path.join(directory, cls.LOOKUP_FILE), lookup)
+
+    @staticmethod
+    def _link(source: str, target: str) -> None:
+        try:
+            os.link(source, target)
+        except OSError:
+            # File systems without hard links get a copy; appending to it is still safe
+            shutil.copyfile(source, target)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def position_of(self, chunk_id: str) -> Optional[int]:
+        """Vector position of a chunk, or None if the store does not hold it."""
+        key = chunk_id.encode("utf-8")
+        if not len(self.lookup) or len(key) > self.lookup.dtype["id"].itemsize:
+            return None
+        i = int(np.searchsorted(self.lookup["id"], key))
+        if i < len(self.lookup) and self.lookup["id"][i] == key:
+            return int(self.lookup["position"][i])
+        return None
+
+    def get(self, position: int) -> Document:
+        """Decode the chunk at a vector position."""
+        row = self.positions[position]
+        start = int(row["offset"])
+        record = json.loads(self._data[start:start + int(row["length"])])
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Look up a chunk by ID, returning a message like InMemoryDocstore if it is missing."""
+        position = self.position_of(search)
+        if position is None:
+            return f"ID {search} not found."
+        return self.get(position)
+
+
+class ChunkOverlay(Docstore, AddableMixin):
+    """
+    Editable view of a ChunkStore used while ingestion changes a snapshot copy.
+
+    Added chunks are kept in memory and deleted IDs are masked; the underlying
+    store is never touched, so editing costs nothing for unchanged chunks.
+    """
+
+    def __init__(self, base: ChunkStore):
+        self.base = base
+        self.added: Dict[str, Document] = {}
+        self.deleted: set = set()
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [i for i in texts if i in self.added or (i not in self.deleted and self.base.position_of(i) is not None)]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self.added.update(texts)
+        self.deleted.difference_update(texts)
+
+    def delete(self, ids: List) -> None:
+        for chunk_id in ids:
+            if self.added.pop(chunk_id, None) is None:
+                self.deleted.add(chunk_id)
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self.added:
+            return self.added[search]
+        if search in self.deleted:
+            return f"ID {search} not found."
+        return self.base.search(search)
+
+
+class PositionIds(Mapping):
+    """
+    Vector position to chunk ID mapping backed by a ChunkStore's position table.
+    Tombstoned positions are not in the mapping.
+    """
+
+    def __init__(self, positions: np.ndarray, n_tombstones: int = 0):
+        self._positions = positions
+        self._n_tombstones = n_tombstones
+
+    def __getitem__(self, position: int) -> str:
+        if not 0 <= position < len(self._positions):
+            raise KeyError(position)
+        chunk_id = self._positions["id"][position]
+        if not chunk_id:
+            raise KeyError(position)
+        return chunk_id.decode("utf-8")
+
+    def __iter__(self) -> Iterator[int]:
+        if not self._n_tombstones:
+            return iter(range(len(self._positions)))
+        return iter(np.flatnonzero(self._positions["id"] != b"").tolist())
+
+    def __len__(self) -> int:
+        return len(self._positions) - self._n_tombstones
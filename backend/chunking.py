@@ -0,0 +1,209 @@
+from langchain_core.documents import Document
+from context import estimate_tokens
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import re
+
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+MARKDOWN_FENCE = re.compile(r"^[ \t]*(```|~~~)")
+# "2 Failover" or "2.1 Failover"; "2. Restart the service" is a list item, not a heading
+NUMBERED_HEADING = re.compile(r"^(\d{1,2}(?:\.\d{1,2})*)\.?[ \t]+([A-Z][^\n]{0,79})$")
+NUMBERED_LIST_ITEM = re.compile(r"^\d{1,2}[.)][ \t]")
+# Separators tried in order when a section is too long for one chunk
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+class Section:
+    """A span of a document's text under one heading path."""
+
+    def __init__(self, start: int, end: int, headings: List[str]):
+        self.start = start
+        self.end = end
+        self.headings = headings
+
+
+class StructuredChunker:
+    """
+    Split documents along their structure into chunks of bounded token size.
+
+    Markdown files are cut at their headings (outside fenced code blocks) and
+    PDF pages at numbered section headings such as "2.1 Failover"; a page
+    never shares a chunk with the next one. Every chunk carries the path of
+    headings it sits under as "headings" metadata, which persists across the
+    pages of a PDF. A section that fits chunk_tokens becomes one chunk, and
+    consecutive small sections are packed together while they fit; longer
+    sections are split at paragraphs, then lines, then sentences, so steps of a
+    runbook are only cut when a single one exceeds the limit. Adjacent chunks
+    of a split section share about overlap_tokens.
+
+    Chunks are exact slices of their document with a "start_index" offset, as
+    ContextPacker expects, and are yielded one at a time.
+    """
+
+    def __init__(self, chunk_tokens: int = 256, overlap_tokens: int = 32,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        """
+        Args:
+            chunk_tokens (int): Maximum tokens per chunk.
+            overlap_tokens (int): Tokens repeated between consecutive chunks of a split section.
+            count_tokens (Callable[[str], int]): Token counter used for sizing.
+        """
+        if chunk_tokens <= 0:
+            raise ValueError("chunk_tokens must be positive")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = max(0, min(overlap_tokens, chunk_tokens // 2))
+        self.count_tokens = count_tokens
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Settings recorded in the manifest; changing any of them re-chunks every file."""
+        return {"name": "structured", "chunk_tokens": self.chunk_tokens, "overlap_tokens": self.overlap_tokens}
+
+    @property
+    def fingerprint(self) -> str:
+        """Short digest of the settings, mixed into chunk IDs."""
+        return hashlib.sha1(json.dumps(self.settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+    def split(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Yield the chunks of the documents of one file, in order."""
+        headings: List[str] = []
+        for doc in documents:
+            text = doc.page_content
+            source = str(doc.metadata.get("source", ""))
+            if source.lower().endswith(MARKDOWN_EXTENSIONS):
+                sections = self._markdown_sections(text)
+            elif source.lower().endswith(".pdf"):
+                sections = self._numbered_sections(text, headings)
+                if sections:
+                    headings = sections[-1].headings
+            else:
+                sections = [Section(0, len(text), [])]
+            for start, end, path in self._pack(text, sections):
+                chunk = self._slice(doc, start, end, path)
+                if chunk is not None:
+                    yield chunk
+
+    @staticmethod
+    def _markdown_sections(text: str) -> List[Section]:
+        sections = [Section(0, 0, [])]
+        path: List[Tuple[int, str]] = []
+        fenced = False
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            if MARKDOWN_FENCE.match(line):
+                fenced = not fenced
+            match = None if fenced else MARKDOWN_HEADING.match(line.rstrip("\r\n"))
+            if match:
+                level = len(match.group(1))
+                path = [(l, t) for l, t in path if l < level] + [(level, match.group(2).strip())]
+                sections[-1].end = offset
+                sections.append(Section(offset, offset, [t for _, t in path]))
+            offset += len(line)
+        sections[-1].end = len(text)
+        return sections
+
+    @staticmethod
+    def _numbered_sections(text: str, headings: List[str]) -> List[Section]:
+        """Sections of a PDF page; the page opens under the headings the previous one ended with."""
+        sections = [Section(0, 0, list(headings))]
+        path = [(i + 1, t) for i, t in enumerate(headings)]
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            stripped = line.strip()
+            match = NUMBERED_HEADING.match(stripped)
+            if (match and not stripped.endswith((".", ",", ";", ":"))
+                    and ("." in match.group(1) or not NUMBERED_LIST_ITEM.match(stripped))):
+                level = match.group(1).count(".") + 1
+                path = [(l, t) for l, t in path if l < level] + [(level, stripped)]
+                sections[-1].end = offset
+                sections.append(Section(offset, offset, [t for _, t in path]))
+            offset += len(line)
+        sections[-1].end = len(text)
+        return sections
+
+    def _pack(self, text: str, sections: List[Section]) -> Iterator[Tuple[int, int, List[str]]]:
+        """Chunk spans of text, merging small sections and splitting large ones."""
+        pending: Optional[List[Any]] = None  # [start, end, headings, tokens]
+        for section in sections:
+            if not text[section.start:section.end].strip():
+                continue
+            tokens = self.count_tokens(text[section.start:section.end])
+            if tokens > self.chunk_tokens:
+                if pending:
+                    yield tuple(pending[:3])
+                    pending = None
+                for start, end in self._split_span(text, section.start, section.end):
+                    yield start, end, section.headings
+                continue
+            if pending and pending[3] + tokens <= self.chunk_tokens:
+                pending[1] = section.end
+                # Text before the first heading does not narrow the path
+                if section.headings:
+                    pending[2] = _common_prefix(pending[2], section.headings) if pending[2] else section.headings
+                pending[3] += tokens
+                continue
+            if pending:
+                yield tuple(pending[:3])
+            pending = [section.start, section.end, section.headings, tokens]
+        if pending:
+            yield tuple(pending[:3])
+
+    def _pieces(self, text: str, start: int, end: int, level: int = 0) -> Iterator[Tuple[int, int]]:
+        """Consecutive spans covering start..end, each within chunk_tokens where separators allow."""
+        if self.count_tokens(text[start:end]) <= self.chunk_tokens:
+            yield start, end
+            return
+        if level == len(SEPARATORS):
+            # No separator left: cut by characters, proportionally to the token count
+            step = max(1, (end - start) * self.chunk_tokens // max(self.count_tokens(text[start:end]), 1))
+            for i in range(start, end, step):
+                yield i, min(i + step, end)
+            return
+        separator = SEPARATORS[level]
+        position = start
+        while position < end:
+            found = text.find(separator, position, end)
+            piece_end = end if found == -1 else found + len(separator)
+            yield from self._pieces(text, position, piece_end, level + 1)
+            position = piece_end
+
+    def _split_span(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """Greedily pack pieces of a long span into chunks that overlap by about overlap_tokens."""
+        pieces = [(s, e, self.count_tokens(text[s:e])) for s, e in self._pieces(text, start, end)]
+        first = 0
+        while first < len(pieces):
+            last, tokens = first, pieces[first][2]
+            while last + 1 < len(pieces) and tokens + pieces[last + 1][2] <= self.chunk_tokens:
+                last += 1
+                tokens += pieces[last][2]
+            yield pieces[first][0], pieces[last][1]
+            if last + 1 == len(pieces):
+                return
+            # Start the next chunk far enough back to repeat the tail of this one
+            following, overlap = last + 1, 0
+            while following - 1 > first and overlap + pieces[following - 1][2] <= self.overlap_tokens:
+                following -= 1
+                overlap += pieces[following][2]
+            first = following
+
+    @staticmethod
+    def _slice(doc: Document, start: int, end: int, headings: List[str]) -> Optional[Document]:
+        raw = doc.page_content[start:end]
+        content = raw.strip()
+        if not content:
+            return None
+        metadata = dict(doc.metadata)
+        metadata["start_index"] = start + (len(raw) - len(raw.lstrip()))
+        metadata["headings"] = list(headings)
+        return Document(page_content=content, metadata=metadata)
+
+
+def _common_prefix(first: List[str], second: List[str]) -> List[str]:
+    prefix = []
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        prefix.append(a)
+    return prefix
@@ -0,0 +1,299 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from model import RAGModel
+from sessions import ChatSession
+from snapshots import ShardedSnapshot, SnapshotStore
+import threading
+import logging
+import re
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION = "default"
+COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+class CollectionNotFoundError(Exception):
+    """Raised when a question names a collection without an index."""
+
+
+def collection_name(dirname: str) -> Optional[str]:
+    """
+    Collection name of a subdirectory of the documents directory, or None if it
+    is not a collection. Directory names that are not valid collection names are
+    sanitized: runs of other characters become "-" and leading "_", "." or "-"
+    are dropped, so "Q3 reports" becomes the "Q3-reports" collection. Hidden
+    directories are not collections, nor is one named "default", which would
+    clash with the collection of files directly in the documents directory.
+    """
+    if dirname.startswith(".") or dirname == DEFAULT_COLLECTION:
+        return None
+    if COLLECTION_NAME_RE.match(dirname):
+        return dirname
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "-", dirname).lstrip("_.-")[:64]
+    return name if name and name != DEFAULT_COLLECTION else None
+
+
+class CollectionManager:
+    """
+    One index per named collection, loaded on demand and evicted LRU.
+
+    Every subdirectory of the documents directory is a collection named after
+    it (see collection_name), including the files in its own subdirectories;
+    files directly in the documents directory form the "default" collection.
+    Each collection has its own vector store, manifest and
+    snapshots under <vector_store_path>/collections/<name>, so updating one
+    collection never rebuilds or loads the others. At most max_loaded
+    collections are kept in memory; questions spanning several collections
+    search them in parallel and merge the results.
+    """
+
+    def __init__(self, data_dir: str, vector_store_path: str,
+                 model_factory: Callable[..., RAGModel], max_loaded: int = 8,
+                 embedding_cache_path: Optional[str] = None):
+        """
+        Args:
+            data_dir (str): Documents directory.
+            vector_store_path (str): Root directory for the per-collection indexes.
+            model_factory (Callable[..., RAGModel]): Creates a model given data_dir,
+                vector_store_path, recursive and embedding_cache_path keyword arguments.
+            max_loaded (int): Collections kept in memory.
+            embedding_cache_path (Optional[str]): SQLite embedding cache shared by the
+                collections. Defaults to one inside vector_store_path.
+        """
+        self.data_dir = data_dir
+        self.vector_store_path = vector_store_path
+        self.model_factory = model_factory
+        self.max_loaded = max(1, max_loaded)
+        self.embedding_cache_path = embedding_cache_path or os.path.join(vector_store_path, "embedding_cache.sqlite")
+        self._models: "OrderedDict[str, RAGModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ingest_locks: Dict[str, threading.Lock] = {}
+        # Collection name -> subdirectory, for directories whose names were sanitized
+        self._dirs: Dict[str, str] = {}
+
+    @staticmethod
+    def validate_name(name: str) -> str:
+        if not COLLECTION_NAME_RE.match(name):
+            raise ValueError(f"Invalid collection name: {name!r}")
+        return name
+
+    def names(self) -> List[str]:
+        """
+        Collections present in the documents directory. Subdirectories that are
+        not collections, or whose sanitized name another one already has, are
+        skipped with a warning; their files are not indexed.
+        """
+        dirs: Dict[str, str] = {}
+        has_files = False
+        with os.scandir(self.data_dir) as scan:
+            # Directories named validly keep their name over ones sanitized to it
+            entries = sorted(scan, key=lambda e: (not COLLECTION_NAME_RE.match(e.name), e.name))
+        for entry in entries:
+            if entry.is_file():
+                has_files = True
+            elif not entry.is_dir():
+                continue
+            elif entry.name == DEFAULT_COLLECTION:
+                logger.warning(f"Skipping directory {entry.path}: it clashes with the default collection "
+                               f"of the files directly in {self.data_dir}; rename it to index its files")
+            elif entry.name.startswith("."):
+                logger.warning(f"Skipping hidden directory {entry.path}")
+            else:
+                name = collection_name(entry.name)
+                if name is None:
+                    logger.warning(f"Skipping directory {entry.path}: no valid collection name can be made from it")
+                elif name in dirs:
+                    logger.warning(f"Skipping directory {entry.path}: its collection name {name!r} "
+                                   f"is taken by {dirs[name]!r}")
+                else:
+                    if name != entry.name:
+                        logger.info(f"Directory {entry.path} is indexed as collection {name!r}")
+                    dirs[name] = entry.name
+        with self._lock:
+            self._dirs = dirs
+        return sorted(list(dirs) + ([DEFAULT_COLLECTION] if has_files else []))
+
+    def collection_of(self, rel_path: str) -> Optional[str]:
+        """
+        Collection a file belongs to, given its path relative to the documents
+        directory, or None if its directory is skipped. Reflects the last names() call.
+        """
+        parts = rel_path.replace(os.sep, "/").split("/")
+        if len(parts) == 1:
+            return DEFAULT_COLLECTION
+        with self._lock:
+            return next((name for name, dirname in self._dirs.items() if dirname == parts[0]), None)
+
+    def store_path_for(self, name: str) -> str:
+        """Directory holding the index snapshots of a collection."""
+        return os.path.join(self.vector_store_path, "collections", self.validate_name(name))
+
+    def is_indexed(self, name: str) -> bool:
+        """Whether a collection has a published index."""
+        return os.path.exists(os.path.join(self.store_path_for(name), SnapshotStore.POINTER))
+
+    def indexed_names(self) -> List[str]:
+        """Collections with a published index."""
+        root = os.path.join(self.vector_store_path, "collections")
+        if not os.path.isdir(root):
+            return []
+        return sorted(name for name in os.listdir(root) if COLLECTION_NAME_RE.match(name) and self.is_indexed(name))
+
+    def data_dir_for(self, name: str) -> str:
+        """Directory holding the documents of a collection."""
+        if name == DEFAULT_COLLECTION:
+            return self.data_dir
+        with self._lock:
+            dirname = self._dirs.get(name)
+        return os.path.join(self.data_dir, dirname or self.validate_name(name))
+
+    def _create(self, name: str) -> RAGModel:
+        return self.model_factory(
+            data_dir=self.data_dir_for(name),
+            vector_store_path=self.store_path_for(name),
+            recursive=name != DEFAULT_COLLECTION,
+            embedding_cache_path=self.embedding_cache_path,
+        )
+
+    def _model(self, name: str) -> RAGModel:
+        """Return the model of a collection, creating it (unloaded) if needed."""
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._models.move_to_end(name)
+                return model
+        model = self._create(self.validate_name(name))
+        with self._lock:
+            # Another thread may have created it meanwhile
+            model = self._models.setdefault(name, model)
+            self._models.move_to_end(name)
+            while len(self._models) > self.max_loaded:
+                evicted, _ = self._models.popitem(last=False)
+                logger.info(f"Evicted collection {evicted} from memory")
+            return model
+
+    def _ingest_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._ingest_locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> RAGModel:
+        """
+        Return a collection ready for questions, loading its index if needed.
+
+        Raises:
+            CollectionNotFoundError: If the collection has no index.
+        """
+        if name not in self.loaded() and not self.is_indexed(name):
+            # Do not create directories for unknown collections
+            raise CollectionNotFoundError(f"Collection {name!r} has no indexed documents")
+        model = self._model(name)
+        if model.snapshot is None:
+            with self._ingest_lock(name):
+                if model.snapshot is None:
+                    model.load_vector_store(mmap=True)
+        if model.snapshot is None:
+            raise CollectionNotFoundError(f"Collection {name!r} has no indexed documents")
+        if model.prompt is None:
+            model.initialize_qa_chain()
+        return model
+
+    def ingest(self, name: str, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Bring one collection's index in line with its documents."""
+        with self._ingest_lock(name):
+            model = self._model(name)
+            if model.is_index_current():
+                if model.snapshot is None:
+                    model.load_vector_store(mmap=True)
+                report = {}
+            else:
+                report = model.load_and_process_documents(progress)
+            if model.snapshot is not None and model.prompt is None:
+                model.initialize_qa_chain()
+            return report
+
+    def ingest_files(self, files: List[str], progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Update the collections the given files belong to.
+
+        Returns:
+            Dict[str, Any]: The ingestion report, with counts summed over collections,
+            failed files relative to the documents directory and a per-collection breakdown.
+        """
+        report: Dict[str, Any] = {"failed": {}, "collections": {}}
+        # Picks up directories the upload created; skipped ones are logged there
+        self.names()
+        for name in sorted({self.collection_of(f) for f in files} - {None}):
+            collection_report = self.ingest(name, progress)
+            report["collections"][name] = collection_report
+            for key, value in collection_report.items():
+                if isinstance(value, int):
+                    report[key] = report.get(key, 0) + value
+            prefix = "" if name == DEFAULT_COLLECTION else os.path.basename(self.data_dir_for(name)) + "/"
+            for rel_path, error in collection_report.get("failed", {}).items():
+                report["failed"][prefix + rel_path] = error
+        return report
+
+    def refresh(self) -> List[str]:
+        """
+        Pick up snapshots published by another process, e.g. the indexer of a
+        read-only query replica. Only collections in memory are checked; the
+        others load their current snapshot when first asked.
+
+        Returns:
+            List[str]: Collections whose snapshot changed.
+        """
+        changed = []
+        for name, model in self.loaded().items():
+            with self._ingest_lock(name):
+                if model.refresh():
+                    changed.append(name)
+        return changed
+
+    def loaded(self) -> Dict[str, RAGModel]:
+        with self._lock:
+            return dict(self._models)
+
+    def _resolve(self, names: Optional[List[str]]) -> Dict[str, RAGModel]:
+        """Ready models of the named collections; all collections with an index if names is empty."""
+        models = {}
+        for name in names or self.indexed_names():
+            try:
+                models[name] = self.get(name)
+            except CollectionNotFoundError:
+                if names:
+                    raise
+        if not models:
+            raise CollectionNotFoundError("No documents have been indexed yet")
+        return models
+
+    def _route(self, names: Optional[List[str]]):
+        """The model that answers and the snapshot it searches."""
+        models = self._resolve(names)
+        lead = next(iter(models.values()))
+        if len(models) == 1:
+            return lead, lead.snapshot
+        return lead, ShardedSnapshot({name: model.snapshot for name, model in models.items()})
+
+    def get_answer(self, question: str, names: Optional[List[str]] = None,
+                   session: Optional[ChatSession] = None) -> Dict[str, Any]:
+        """Answer from the given collections, or from all of them, within an optional chat session."""
+        try:
+            model, snapshot = self._route(names)
+        except Exception as e:
+            logger.error(f"Error routing question: {str(e)}")
+            return {"answer": str(e), "error": str(e), "status": "error"}
+        return model.get_answer(question, snapshot, session)
+
+    def stream_answer(self, question: str, names: Optional[List[str]] = None,
+                      session: Optional[ChatSession] = None) -> Iterator[Dict[str, Any]]:
+        """Stream an answer from the given collections, or from all of them, within an optional chat session."""
+        try:
+            model, snapshot = self._route(names)
+        except Exception as e:
+            logger.error(f"Error routing question: {str(e)}")
+            yield {"type": "error", "status": "error", "error": str(e)}
+            return
+        yield from model.stream_answer(question, snapshot, session)
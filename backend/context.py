@@ -0,0 +1,183 @@
+from langchain_core.documents import Document
+from typing import Callable, Dict, List, Optional, Tuple
+import math
+import re
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """Rough token count for budgeting; about 4 characters per token for English with Mistral."""
+    return math.ceil(len(text) / chars_per_token) if text else 0
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _suffix_prefix_overlap(first: str, second: str, max_overlap: int) -> int:
+    """Length of the longest suffix of first that is also a prefix of second."""
+    for length in range(min(len(first), len(second), max_overlap), 0, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+class ContextBlock:
+    """A run of one or more merged chunks from the same source."""
+
+    def __init__(self, doc: Document, rank: int):
+        self.text = doc.page_content
+        self.metadata = dict(doc.metadata)
+        self.rank = rank
+        self.start = doc.metadata.get("start_index")
+        self.end = self.start + len(self.text) if self.start is not None else None
+
+    def merge(self, doc: Document, rank: int, min_overlap: int, max_gap: int) -> bool:
+        """Append doc if it continues this block; return whether it did."""
+        start = doc.metadata.get("start_index")
+        text = doc.page_content
+        if self.start is not None and start is not None:
+            if start < self.start or start > self.end + max_gap:
+                return False
+            if start + len(text) <= self.end:
+                # Fully contained in this block
+                self.rank = min(self.rank, rank)
+                return True
+            skip = self.end - start
+            self.text = self.text + (text[skip:] if skip >= 0 else "\n" + text)
+            self.end = start + len(text)
+        else:
+            overlap = _suffix_prefix_overlap(self.text, text, max_overlap=len(text))
+            if overlap < min_overlap:
+                return False
+            self.text += text[overlap:]
+        self.rank = min(self.rank, rank)
+        return True
+
+
+class PackedContext:
+    """Context text assembled for one prompt, with token accounting."""
+
+    def __init__(self, text: str, blocks: List[ContextBlock], stats: Dict[str, int]):
+        self.text = text
+        self.blocks = blocks
+        self.stats = stats
+
+
+class ContextPacker:
+    """
+    Assemble retrieved chunks into prompt context under a token budget.
+
+    Chunks from the same source that overlap or directly follow each other are
+    merged into one block, so the splitter's overlap is sent once. Blocks that
+    are near-duplicates of a better-ranked block are dropped. The remaining
+    blocks are added best-ranked first until the budget is spent; the block
+    that crosses the budget is cut at a word boundary.
+    """
+
+    def __init__(self, token_budget: int = 1500, duplicate_threshold: float = 0.9,
+                 min_overlap: int = 20, max_gap: int = 2,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        """
+        Args:
+            token_budget (int): Maximum context tokens. 0 or less disables the budget.
+            duplicate_threshold (float): Jaccard similarity of word 3-shingles at which a
+                block counts as a near-duplicate.
+            min_overlap (int): Shortest shared text, in characters, that merges two chunks
+                without position metadata.
+            max_gap (int): Characters allowed between chunks that are merged as adjacent;
+                covers the separator the splitter dropped.
+            count_tokens (Callable[[str], int]): Token counter used for the budget.
+        """
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.min_overlap = min_overlap
+        self.max_gap = max_gap
+        self.count_tokens = count_tokens
+
+    @staticmethod
+    def _group_key(doc: Document) -> Tuple:
+        return doc.metadata.get("source"), doc.metadata.get("page")
+
+    def _merge(self, sources: List[Document]) -> List[ContextBlock]:
+        groups: Dict[Tuple, List[Tuple[int, Document]]] = {}
+        for rank, doc in enumerate(sources):
+            groups.setdefault(self._group_key(doc), []).append((rank, doc))
+
+        blocks = []
+        for members in groups.values():
+            # Document order within the source, falling back to retrieval order
+            members.sort(key=lambda m: (m[1].metadata.get("start_index", -1), m[1].metadata.get("chunk_index", m[0])))
+            current: Optional[ContextBlock] = None
+            for rank, doc in members:
+                if current is None or not current.merge(doc, rank, self.min_overlap, self.max_gap):
+                    current = ContextBlock(doc, rank)
+                    blocks.append(current)
+        blocks.sort(key=lambda b: b.rank)
+        return blocks
+
+    def _deduplicate(self, blocks: List[ContextBlock]) -> List[ContextBlock]:
+        kept, kept_shingles = [], []
+        for block in blocks:
+            shingles = _shingles(block.text)
+            duplicate = any(
+                block.text in other.text
+                or (shingles and len(shingles & seen) / len(shingles | seen) >= self.duplicate_threshold)
+                for other, seen in zip(kept, kept_shingles)
+            )
+            if not duplicate:
+                kept.append(block)
+                kept_shingles.append(shingles)
+        return kept
+
+    def _truncate(self, text: str, tokens: int) -> str:
+        """Cut text to about tokens tokens, at a word boundary."""
+        if tokens <= 0:
+            return ""
+        cut = text[:max(1, int(len(text) * tokens / max(self.count_tokens(text), 1)))]
+        while cut and self.count_tokens(cut) > tokens:
+            cut = cut[:int(len(cut) * 0.9)]
+        return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+    def pack(self, sources: List[Document]) -> PackedContext:
+        """
+        Build the context for sources, given best first.
+
+        The stats report the tokens a plain concatenation of all sources would
+        have used ("tokens_in"), the tokens actually used ("tokens_out") and the
+        difference ("tokens_saved").
+        """
+        separator = "\n\n"
+        tokens_in = self.count_tokens(separator.join(doc.page_content for doc in sources))
+        merged = self._merge(sources)
+        blocks = self._deduplicate(merged)
+
+        packed, used, truncated = [], 0, 0
+        separator_tokens = self.count_tokens(separator)
+        for block in blocks:
+            cost = self.count_tokens(block.text) + (separator_tokens if packed else 0)
+            if self.token_budget > 0 and used + cost > self.token_budget:
+                remaining = self.token_budget - used - (separator_tokens if packed else 0)
+                block.text = self._truncate(block.text, remaining)
+                if block.text:
+                    packed.append(block)
+                    truncated += 1
+                break
+            packed.append(block)
+            used += cost
+
+        text = separator.join(block.text for block in packed)
+        tokens_out = self.count_tokens(text)
+        return PackedContext(text, packed, {
+            "chunks": len(sources),
+            "blocks": len(packed),
+            "dropped_duplicates": len(merged) - len(blocks),
+            "truncated": truncated,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": max(0, tokens_in - tokens_out),
+        })
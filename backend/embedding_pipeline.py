@@ -0,0 +1,238 @@
+from langchain_core.embeddings import Embeddings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Union
+import numpy as np
+import threading
+import hashlib
+import logging
+import pathlib
+import sqlite3
+import time
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    """Return the hex SHA-256 digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed on (model name, chunk text hash), backed by SQLite."""
+
+    def __init__(self, path: str, read_only: bool = False):
+        """
+        Args:
+            path (str): SQLite file holding the cache. Created if missing, unless read-only.
+            read_only (bool): Only read the cache, e.g. from a query replica sharing the
+                indexer's volume. The file is opened read-only once it exists, and
+                vectors are not stored.
+        """
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if read_only:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        """Connection to read from; a read-only cache connects once the indexer has created the file."""
+        if self._conn is None and os.path.exists(self.path):
+            uri = f"{pathlib.Path(self.path).absolute().as_uri()}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._conn
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for the hashes that are present."""
+        found = {}
+        with self._lock:
+            conn = self._reader()
+            if conn is None:
+                return found
+            try:
+                # Stay well below SQLite's bound parameter limit
+                for start in range(0, len(hashes), 500):
+                    batch = hashes[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                        [model, *batch],
+                    ).fetchall()
+                    for h, blob in rows:
+                        found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+            except sqlite3.Error as e:
+                if not self.read_only:
+                    raise
+                # The indexer may not have created the table yet; treat it as a miss
+                logger.warning(f"Cannot read embedding cache {self.path}: {str(e)}")
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        """Store vectors keyed by text hash. A read-only cache stores nothing."""
+        if self.read_only:
+            return
+        rows = [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in vectors.items()]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+
+
+class CachedBatchEmbeddings(Embeddings):
+    """
+    Embedding stage used for ingestion.
+
+    Wraps an embeddings client and embeds documents in batches of batch_size with
+    at most max_in_flight batches in flight against the embedding server. Failed
+    batches are retried with exponential backoff. Texts are deduplicated and
+    looked up in the on-disk cache first, so unchanged and repeated chunks are
+    never sent to the server twice. Queries are passed straight through.
+
+    The wrapped client may be given as a factory; it is then only created when
+    something actually needs embedding, so loading a published index stays
+    free of client setup.
+    """
+
+    def __init__(
+        self,
+        embeddings: Union[Embeddings, Callable[[], Embeddings]],
+        model_name: str,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 32,
+        max_in_flight: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        self._embeddings: Optional[Embeddings] = None
+        self._factory: Optional[Callable[[], Embeddings]] = None
+        if isinstance(embeddings, Embeddings):
+            self._embeddings = embeddings
+        else:
+            self._factory = embeddings
+        self._client_lock = threading.Lock()
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.last_stats: Dict[str, float] = {}
+        self._query_pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """The wrapped client, created from the factory on first use."""
+        if self._embeddings is None:
+            with self._client_lock:
+                if self._embeddings is None:
+                    self._embeddings = self._factory()
+        return self._embeddings
+
+    @embeddings.setter
+    def embeddings(self, embeddings: Embeddings) -> None:
+        self._embeddings = embeddings
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch, retrying with exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Embedding batch failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str], progress: Optional[Callable[[int], None]] = None) -> List[List[float]]:
+        """
+        Embed texts through the cache and the batched, bounded-concurrency client.
+
+        Args:
+            texts (List[str]): Texts to embed.
+            progress (Optional[Callable[[int], None]]): Called with the number of unique
+                texts done so far, after the cache lookup and after every batch.
+        """
+        started = time.perf_counter()
+        hashes = [text_hash(t) for t in texts]
+        unique = dict(zip(hashes, texts))
+
+        vectors = self.cache.get_many(self.model_name, list(unique)) if self.cache else {}
+        missing = [h for h in unique if h not in vectors]
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        if progress:
+            progress(len(vectors))
+
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches))) as pool:
+                results = pool.map(lambda batch: self._embed_batch([unique[h] for h in batch]), batches)
+                for batch, batch_vectors in zip(batches, results):
+                    embedded = dict(zip(batch, batch_vectors))
+                    if self.cache:
+                        self.cache.put_many(self.model_name, embedded)
+                    vectors.update(embedded)
+                    if progress:
+                        progress(len(vectors))
+
+        elapsed = time.perf_counter() - started
+        self.last_stats = {
+            "chunks": len(texts),
+            "unique": len(unique),
+            "cached": len(unique) - len(missing),
+            "embedded": len(missing),
+            "seconds": elapsed,
+            "chunks_per_sec": len(texts) / elapsed if elapsed > 0 else 0.0,
+        }
+        if texts:
+            logger.info(
+                f"Embedded {len(texts)} chunks ({len(unique) - len(missing)} cached, "
+                f"{len(missing)} sent to server) in {elapsed:.2f}s, "
+                f"{self.last_stats['chunks_per_sec']:.1f} chunks/sec"
+            )
+        return [vectors[h] for h in hashes]
+
+    def lookup(self, texts: List[str]) -> List[List[float]]:
+        """
+        Vectors for already indexed texts, read from the cache.
+
+        Texts missing from the cache are embedded in one batch and cached, unless
+        the cache is read-only, without touching last_stats. Meant for small
+        candidate sets at query time.
+        """
+        hashes = [text_hash(t) for t in texts]
+        vectors = self.cache.get_many(self.model_name, hashes) if self.cache else {}
+        missing = {h: t for h, t in zip(hashes, texts) if h not in vectors}
+        if missing:
+            embedded = dict(zip(missing, self._embed_batch(list(missing.values()))))
+            if self.cache:
+                self.cache.put_many(self.model_name, embedded)
+            vectors.update(embedded)
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query with the wrapped client."""
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries at once, e.g. a micro-batch of concurrent questions.
+
+        Duplicates are embedded once. The wrapped client embeds queries one at a
+        time, so distinct queries are sent concurrently, at most max_in_flight at once.
+        """
+        unique = list(dict.fromkeys(texts))
+        if len(unique) == 1:
+            vectors = {unique[0]: self.embed_query(unique[0])}
+        else:
+            if self._query_pool is None:
+                self._query_pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed-query")
+            vectors = dict(zip(unique, self._query_pool.map(self.embed_query, unique)))
+        return [vectors[t] for t in texts]
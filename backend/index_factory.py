@@ -0,0 +1,305 @@
+from typing import Dict, Optional
+import numpy as np
+import logging
+import faiss
+import math
+import time
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Minimum training vectors per IVF list / per PQ centroid that FAISS considers sane
+MIN_POINTS_PER_CENTROID = 39
+PQ_CENTROIDS = 256
+# Headroom on each side of the value range a scalar quantizer is trained on, as a share
+# of that range, so vectors added later fit it without being clipped
+SQ_TRAIN_MARGIN = 0.05
+# Share of an HNSW index's positions that may be tombstones before it is rebuilt
+MAX_TOMBSTONE_RATIO = 0.2
+
+# Vector encodings for the stored index; scalar quantizers keep one code per dimension
+VECTOR_STORAGE_CODES = {"float32": None, "fp16": "SQfp16", "int8": "SQ8"}
+
+
+def resolve_spec(spec: str, n_vectors: int, warn: bool = True) -> str:
+    """
+    Turn an index spec into a FAISS index_factory string.
+
+    Specs are index_factory strings ("Flat", "IVF1024,Flat", "IVF1024,PQ32",
+    "HNSW32", ...). "IVF" without a list count picks about 4 * sqrt(n) lists for
+    the corpus at hand. Specs that need more training data than is available
+    fall back to "Flat", with a warning unless warn is False.
+    """
+    spec = spec.strip()
+    if spec.startswith("IVF,") or spec == "IVF":
+        nlist = max(1, int(4 * math.sqrt(n_vectors)))
+        spec = f"IVF{nlist}," + (spec[4:] or "Flat")
+
+    ivf = re.match(r"IVF(\d+)", spec)
+    too_few = ((ivf and n_vectors < int(ivf.group(1)) * MIN_POINTS_PER_CENTROID // 4)
+               or ("PQ" in spec and n_vectors < PQ_CENTROIDS * 4))
+    if too_few:
+        if warn:
+            logger.warning(f"{n_vectors} vectors are too few to train {spec}. Using a flat index.")
+        return "Flat"
+    return spec
+
+
+def factory_string(spec: str, n_vectors: int, storage: str = "float32", warn: bool = True) -> str:
+    """The index_factory string build_index uses for spec over n_vectors vectors."""
+    return apply_storage(resolve_spec(spec, n_vectors, warn), storage)
+
+
+def spec_outgrown(spec: str, built: str, n_vectors: int, storage: str = "float32") -> bool:
+    """
+    Whether an index built from the factory string built should be rebuilt for
+    spec now that it holds n_vectors vectors.
+
+    True once a spec that fell back to "Flat" has enough vectors to train, or
+    drops below that again. An "IVF" spec without a list count only rebuilds
+    when its list count would double or halve, not on every change in size.
+    """
+    target = factory_string(spec, n_vectors, storage, warn=False)
+    if target == built:
+        return False
+    if re.match(r"IVF(,|$)", spec.strip()):
+        wanted, current = re.match(r"IVF(\d+)(.*)", target), re.match(r"IVF(\d+)(.*)", built)
+        if wanted and current and wanted.group(2) == current.group(2):
+            return not 0.5 < int(wanted.group(1)) / int(current.group(1)) < 2
+    return True
+
+
+def apply_storage(spec: str, storage: str = "float32") -> str:
+    """
+    Swap the vector encoding of an index_factory string for a compact one.
+
+    "fp16" and "int8" replace full float32 vectors with scalar-quantized codes
+    ("Flat" becomes "SQ8", "IVF1024,Flat" becomes "IVF1024,SQ8", "HNSW32"
+    becomes "HNSW32,SQ8"). Specs that already compress their vectors (PQ, SQ)
+    are left as they are.
+    """
+    if storage not in VECTOR_STORAGE_CODES:
+        raise ValueError(f"Unknown vector storage {storage!r}; expected one of {', '.join(VECTOR_STORAGE_CODES)}")
+    code = VECTOR_STORAGE_CODES[storage]
+    if code is None:
+        return spec
+    parts = spec.split(",")
+    if parts[-1] == "Flat":
+        parts[-1] = code
+    elif re.fullmatch(r"HNSW\d+", parts[-1]):
+        parts.append(code)
+    else:
+        logger.info(f"{spec} already compresses its vectors; ignoring vector storage {storage}.")
+    return ",".join(parts)
+
+
+def build_index(spec: str, vectors: np.ndarray, train_sample: int = 100_000, seed: int = 0,
+                storage: str = "float32") -> faiss.Index:
+    """
+    Create an empty (but trained) L2 index for vectors of this dimension.
+
+    Args:
+        spec (str): Index spec, see resolve_spec.
+        vectors (np.ndarray): Embeddings of the corpus; a random sample is used for training.
+        train_sample (int): Maximum number of vectors used for training.
+        seed (int): Seed for the training sample.
+        storage (str): Vector encoding, see apply_storage.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    factory = factory_string(spec, len(vectors), storage)
+    index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_L2)
+    owner = _scalar_quantizer(index)
+    if owner is not None:
+        owner.sq.rangestat_arg = SQ_TRAIN_MARGIN
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > train_sample:
+            rows = np.random.default_rng(seed).choice(len(vectors), train_sample, replace=False)
+            sample = vectors[rows]
+        started = time.perf_counter()
+        index.train(sample)
+        logger.info(f"Trained {factory} index on {len(sample)} vectors in {time.perf_counter() - started:.2f}s")
+    return index
+
+
+def _scalar_quantizer(index: faiss.Index) -> Optional[faiss.Index]:
+    """The (IVF) scalar-quantizer index holding an index's codes, if they are SQ codes."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return index if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)) else None
+
+
+def exceeds_trained_range(index: faiss.Index, vectors: np.ndarray) -> bool:
+    """
+    Whether adding vectors to a scalar-quantized index would clip them.
+
+    SQ8 (VECTOR_STORAGE=int8) and SQ4/SQ6 codes cover the per-dimension value
+    range seen in training, widened by SQ_TRAIN_MARGIN; values outside it are
+    stored as the nearest bound. IVF indexes quantize residuals to the nearest
+    centroid, which are checked instead. fp16 codes need no range.
+    """
+    owner = _scalar_quantizer(index)
+    if owner is None:
+        return False
+    trained = faiss.vector_to_array(owner.sq.trained)
+    if not len(trained):
+        return False
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if isinstance(owner, faiss.IndexIVF) and owner.by_residual:
+        _, lists = owner.quantizer.search(vectors, 1)
+        vectors = vectors - owner.quantizer.reconstruct_batch(lists.ravel())
+    # Per-dimension minimums then range widths, or one of each for uniform codes
+    vmin, vdiff = trained[:len(trained) // 2], trained[len(trained) // 2:]
+    return bool(np.any(vectors < vmin) or np.any(vectors > vmin + vdiff))
+
+
+def read_index(path: str, mmap: bool = False) -> faiss.Index:
+    """
+    Read an index from disk.
+
+    With mmap the vector codes stay in the file and are paged in on demand, so
+    processes reading the same file share one copy through the page cache.
+    Index types that cannot be mapped are read into memory instead.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    # IO_FLAG_MMAP_IFC (FAISS >= 1.8) maps the codes of flat, SQ and PQ indexes in place
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(path, flags)
+    except RuntimeError as e:
+        logger.warning(f"Cannot memory-map {path}, reading it instead: {str(e)}")
+        return faiss.read_index(path)
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Apply query-time parameters that the index understands; others are ignored."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            # Parameter does not apply to this index type
+            pass
+
+
+def enable_reconstruct(index: faiss.Index) -> None:
+    """
+    Let the index return stored vectors by position with reconstruct_batch.
+
+    Flat, SQ, PQ and HNSW indexes can already; IVF indexes need a direct map
+    from position to list entry, one int64 per vector.
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    ivf.make_direct_map()
+
+
+def removes_in_place(index: faiss.Index) -> bool:
+    """
+    Whether remove_vectors deletes vectors from the index.
+
+    Flat-code (Flat, SQ, PQ) and IVF indexes do. HNSW graphs cannot drop a node;
+    their deleted positions are left as tombstones and excluded at search time.
+    """
+    if isinstance(faiss.downcast_index(index), faiss.IndexFlatCodes):
+        return True
+    try:
+        faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return False
+    return True
+
+
+def remove_vectors(index: faiss.Index, positions: np.ndarray) -> bool:
+    """
+    Delete the vectors at positions and renumber the rest to stay contiguous,
+    in their previous order, as flat-code indexes do by themselves.
+
+    IVF indexes keep the old IDs in their inverted lists; those are rewritten
+    and the direct map is rebuilt. Returns False, leaving the index untouched,
+    for indexes that cannot remove vectors.
+    """
+    if not removes_in_place(index):
+        return False
+    positions = np.unique(np.asarray(positions, dtype=np.int64))
+    if not len(positions):
+        return True
+    if isinstance(faiss.downcast_index(index), faiss.IndexFlatCodes):
+        index.remove_ids(positions)
+        return True
+
+    ivf = faiss.extract_index_ivf(index)
+    # The direct map cannot follow a removal; it is made again once the IDs are contiguous
+    ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+    index.remove_ids(positions)
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+        # Each remaining ID moves down by the number of removed IDs below it
+        renumbered = ids - np.searchsorted(positions, ids)
+        codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+        invlists.update_entries(list_no, 0, size, faiss.swig_ptr(renumbered), faiss.swig_ptr(codes))
+    ivf.make_direct_map()
+    return True
+
+
+def tombstone_search_params(index: faiss.Index, tombstones: np.ndarray) -> Optional[faiss.SearchParameters]:
+    """
+    Search parameters that keep an HNSW index from returning tombstoned
+    positions, or None if there are none. The current efSearch is carried over,
+    since parameters passed to search replace the index's own.
+    """
+    if not len(tombstones):
+        return None
+    excluded = faiss.IDSelectorBatch(np.ascontiguousarray(tombstones, dtype=np.int64))
+    selector = faiss.IDSelectorNot(excluded)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # The selectors are only referenced from C++; keep them alive with the parameters
+    params.selectors = (excluded, selector)
+    return params
+
+
+def recall_at_k(index: faiss.Index, vectors: np.ndarray, queries: np.ndarray, k: int = 5) -> float:
+    """
+    Fraction of the exact top-k neighbours that the index also returns.
+
+    The exact neighbours come from a brute-force search over vectors in place,
+    so no second copy of the corpus is held while a large index is checked.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    _, expected = faiss.knn(queries, vectors, k)
+    _, found = index.search(queries, k)
+    hits = sum(len(set(e[e >= 0]) & set(f[f >= 0])) for e, f in zip(expected, found))
+    return hits / float(expected.size)
+
+
+def evaluate_index(index: faiss.Index, vectors: np.ndarray, k: int = 5, n_queries: int = 200, seed: int = 0) -> Dict[str, float]:
+    """
+    Measure recall@k and per-query latency of an index built from vectors.
+
+    A sample of the corpus vectors serves as queries.
+    """
+    rows = np.random.default_rng(seed).choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+    queries = np.ascontiguousarray(vectors[rows], dtype=np.float32)
+    started = time.perf_counter()
+    index.search(queries, k)
+    elapsed = time.perf_counter() - started
+    return {
+        f"recall_at_{k}": recall_at_k(index, vectors, queries, k),
+        "query_ms": 1000 * elapsed / len(queries),
+    }
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import threading
+import logging
+import time
+import uuid
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class IndexingJobs:
+    """
+    Background indexing worker with job tracking.
+
+    Uploads register a job and return immediately. A single worker thread runs
+    the ingestion function; jobs submitted while it waits out coalesce_window
+    seconds, or while a previous run is in progress, are handled together by the
+    next run. Each job records its progress (files parsed, chunks embedded, ETA)
+    as reported by the ingestion function.
+    """
+
+    def __init__(self, run_ingestion: Callable[[Callable[[Dict[str, Any]], None], List[str]], Dict[str, Any]],
+                 coalesce_window: float = 2.0, max_jobs_kept: int = 1000):
+        """
+        Args:
+            run_ingestion (Callable): Runs one index update. Receives a progress callback
+                and the files of all jobs in the run, and returns the ingestion report.
+            coalesce_window (float): Seconds to wait for more uploads before indexing.
+            max_jobs_kept (int): Finished jobs remembered for /jobs lookups.
+        """
+        self.run_ingestion = run_ingestion
+        self.coalesce_window = coalesce_window
+        self.max_jobs_kept = max_jobs_kept
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._done: Dict[str, threading.Event] = {}
+        self._queued: List[str] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, files: List[str]) -> str:
+        """Queue an index update covering files and return its job ID."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "files": files,
+                "created_at": time.time(),
+                "progress": {},
+                "eta_seconds": None,
+            }
+            self._done[job_id] = threading.Event()
+            self._queued.append(job_id)
+            self._forget_old_jobs()
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="indexing-worker", daemon=True)
+                self._worker.start()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of a job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Block until a job has finished and return it."""
+        done = self._done.get(job_id)
+        if done is not None:
+            done.wait(timeout)
+        return self.get(job_id)
+
+    def _forget_old_jobs(self) -> None:
+        finished = [j for j, job in self._jobs.items() if job["status"] in ("completed", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs_kept)]:
+            del self._jobs[job_id]
+            self._done.pop(job_id, None)
+
+    def _update(self, job_ids: List[str], **fields) -> None:
+        with self._lock:
+            for job_id in job_ids:
+                if job_id in self._jobs:
+                    self._jobs[job_id].update(fields)
+
+    @staticmethod
+    def _eta(progress: Dict[str, Any], started: float) -> Optional[float]:
+        """Estimate the remaining seconds from the rate of the current stage."""
+        elapsed = time.monotonic() - started
+        if progress.get("stage") == "embedding" and progress.get("chunks_embedded"):
+            rate = progress["chunks_embedded"] / max(elapsed - progress.get("parse_seconds", 0.0), 1e-6)
+            return max(0.0, (progress["chunks_total"] - progress["chunks_embedded"]) / rate)
+        if progress.get("stage") == "parsing" and progress.get("files_parsed"):
+            return elapsed / progress["files_parsed"] * (progress["files_total"] - progress["files_parsed"])
+        return None
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            # Give closely spaced uploads a chance to join this run
+            time.sleep(self.coalesce_window)
+            with self._lock:
+                batch, self._queued = self._queued, []
+                self._wakeup.clear()
+            if not batch:
+                continue
+
+            logger.info(f"Indexing {len(batch)} coalesced upload job(s)")
+            started = time.monotonic()
+            self._update(batch, status="running", started_at=time.time())
+
+            def progress(update: Dict[str, Any]) -> None:
+                self._update(batch, progress=dict(update), eta_seconds=self._eta(update, started))
+
+            try:
+                with self._lock:
+                    files = sorted({f for job_id in batch for f in self._jobs.get(job_id, {}).get("files", [])})
+                report = self.run_ingestion(progress, files)
+                for job_id in batch:
+                    files = set(self._jobs.get(job_id, {}).get("files", []))
+                    failed = {f: e for f, e in report.get("failed", {}).items() if f in files}
+                    self._update([job_id], status="completed", failed=failed, eta_seconds=0.0,
+                                 finished_at=time.time(), report=report)
+            except Exception as e:
+                logger.error(f"Indexing job failed: {str(e)}")
+                self._update(batch, status="failed", error=str(e), finished_at=time.time())
+            finally:
+                for job_id in batch:
+                    done = self._done.get(job_id)
+                    if done is not None:
+                        done.set()
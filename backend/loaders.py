@@ -0,0 +1,71 @@
+from langchain_core.documents import Document
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, List, Optional, Tuple
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def load_file(path: str) -> List[Document]:
+    """Load a single PDF, txt or markdown file into documents."""
+    # The parser stacks are only imported once something is ingested
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredFileLoader
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        loader = PyPDFLoader(path)
+    elif extension == ".md":
+        # Raw markdown keeps the headings the chunker splits on
+        loader = TextLoader(path, encoding="utf-8", autodetect_encoding=True)
+    else:
+        loader = UnstructuredFileLoader(path, mode="single")
+    return loader.load()
+
+
+def iter_loaded_files(data_dir: str, rel_paths: List[str], max_workers: int = 4) -> Iterator[Tuple[str, Optional[List[Document]], Optional[str]]]:
+    """
+    Parse files across a process pool and yield them as they finish.
+
+    At most 2 * max_workers files are in flight, so parsed documents never pile
+    up faster than the caller consumes them. A file that fails to parse, or
+    whose worker dies, is reported instead of aborting the other files.
+
+    Args:
+        data_dir (str): Directory the relative paths are resolved against.
+        rel_paths (List[str]): Files to parse.
+        max_workers (int): Worker processes. 0 or 1 parses in the calling process.
+
+    Yields:
+        Tuple[str, Optional[List[Document]], Optional[str]]: relative path, its documents
+        (None on failure) and the error message (None on success).
+    """
+    if max_workers <= 1 or len(rel_paths) <= 1:
+        for rel_path in rel_paths:
+            try:
+                yield rel_path, load_file(os.path.join(data_dir, rel_path)), None
+            except Exception as e:
+                yield rel_path, None, str(e)
+        return
+
+    pending_paths = list(reversed(rel_paths))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = {}
+        while pending_paths or in_flight:
+            while pending_paths and len(in_flight) < 2 * max_workers:
+                rel_path = pending_paths.pop()
+                try:
+                    in_flight[pool.submit(load_file, os.path.join(data_dir, rel_path))] = rel_path
+                except Exception as e:
+                    # The pool is broken after a worker crash
+                    yield rel_path, None, str(e)
+            if not in_flight:
+                continue
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel_path = in_flight.pop(future)
+                try:
+                    yield rel_path, future.result(), None
+                except Exception as e:
+                    yield rel_path, None, str(e)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md")
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(rel_path: str, content_hash: str, index: int, chunker: str = "") -> str:
+    """Deterministic ID for the index-th chunk of a file version, as split by a given chunker."""
+    key = f"{rel_path}\0{content_hash}\0{index}" + (f"\0{chunker}" if chunker else "")
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class DocumentManifest:
+    """
+    Persistent record of the files that are currently indexed.
+
+    For every file (keyed by its path relative to the documents directory) the
+    manifest stores the content hash, size and mtime it was indexed with, and the
+    IDs of the chunks it contributed to the vector store. Size and mtime let a
+    rescan skip hashing files that have not been touched. It also records the
+    index_factory string the index was actually built with, which differs from
+    the configured spec while there are too few vectors to train it.
+    """
+
+    FILENAME = "manifest.json"
+
+    def __init__(self, files: Dict[str, Dict[str, Any]] = None, settings: Dict[str, Any] = None,
+                 built_spec: Optional[str] = None):
+        self.files: Dict[str, Dict[str, Any]] = files or {}
+        # Index settings the files were indexed with; a mismatch forces a rebuild
+        self.settings: Dict[str, Any] = settings or {}
+        # None for manifests written before it was recorded
+        self.built_spec = built_spec
+
+    @classmethod
+    def load(cls, directory: str) -> "DocumentManifest":
+        """Load the manifest stored in directory, or return an empty one."""
+        path = os.path.join(directory, cls.FILENAME)
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data.get("files", {}), data.get("settings", {}), data.get("built_spec"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable manifest {path}: {str(e)}")
+            return cls()
+
+    def save(self, directory: str) -> None:
+        """Atomically write the manifest into directory."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.FILENAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "built_spec": self.built_spec, "files": self.files},
+                      f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def scan(self, data_dir: str, recursive: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Describe every supported file under data_dir.
+
+        With recursive=False only files directly in data_dir are included.
+
+        Files whose size and mtime match the manifest reuse the recorded hash;
+        everything else is hashed.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: relative path -> {"sha256", "size", "mtime"}.
+        """
+        current = {}
+        for root, dirs, filenames in os.walk(data_dir):
+            if not recursive:
+                dirs.clear()
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                path = os.path.join(root, filename)
+                rel_path = os.path.relpath(path, data_dir)
+                stat = os.stat(path)
+                known = self.files.get(rel_path)
+                if known and known.get("size") == stat.st_size and known.get("mtime") == stat.st_mtime:
+                    content_hash = known["sha256"]
+                else:
+                    content_hash = file_sha256(path)
+                current[rel_path] = {
+                    "sha256": content_hash,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                }
+        return current
+
+    def diff(self, current: Dict[str, Dict[str, Any]]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Compare a scan against the manifest.
+
+        Returns:
+            Tuple[List[str], List[str], List[str]]: added, changed and removed relative paths.
+        """
+        added = [p for p in current if p not in self.files]
+        changed = [p for p in current if p in self.files and self.files[p]["sha256"] != current[p]["sha256"]]
+        removed = [p for p in self.files if p not in current]
+        return added, changed, removed
+
+    def chunk_ids(self, rel_paths: List[str]) -> List[str]:
+        """Return the chunk IDs recorded for the given files."""
+        ids = []
+        for rel_path in rel_paths:
+            ids.extend(self.files.get(rel_path, {}).get("chunk_ids", []))
+        return ids
+
+    def all_chunk_ids(self) -> List[str]:
+        """Return the chunk IDs of every indexed file."""
+        return self.chunk_ids(list(self.files))
@@ -0,0 +1,84 @@
+from prometheus_client import Counter, Histogram
+from contextlib import contextmanager
+from typing import Dict, Iterator
+import time
+
+# Buckets from 1 ms up to several minutes cover both query stages and ingestion runs
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+INGEST_STAGE_SECONDS = Histogram(
+    "rag_ingest_stage_seconds",
+    "Time spent per ingestion stage (load, split, embed, index, write), per run.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+INGEST_CHUNKS = Counter(
+    "rag_ingest_chunks_total",
+    "Chunks added to the index.",
+)
+QUERY_STAGE_SECONDS = Histogram(
+    "rag_query_stage_seconds",
+    "Time spent per query stage (embed, search, rerank, prompt, generate, total); search includes rerank.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+GENERATION_TOKENS_PER_SECOND = Histogram(
+    "rag_generation_tokens_per_second",
+    "LLM generation throughput per answer.",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 120, 200),
+)
+CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens",
+    "Estimated context tokens per prompt after packing (packed) and removed by packing (saved).",
+    ["kind"],
+    buckets=(0, 50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 8000),
+)
+QUERIES = Counter(
+    "rag_queries_total",
+    "Questions handled, by outcome (answered, cached, error).",
+    ["outcome"],
+)
+QUERY_BATCH_SIZE = Histogram(
+    "rag_query_batch_size",
+    "Questions sharing one micro-batched call, by stage (embed, search).",
+    ["stage"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+REQUEST_SECONDS = Histogram(
+    "rag_request_seconds",
+    "End-to-end latency of question requests including time queued for a worker.",
+    ["endpoint"],
+    buckets=STAGE_BUCKETS,
+)
+
+
+class StageTimer:
+    """
+    Collects per-stage durations for one query or ingestion run.
+
+    Durations of a stage entered several times are summed. observe() reports
+    them to a histogram labelled by stage once the run is complete.
+    """
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.timings: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as part of stage name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def observe(self) -> Dict[str, float]:
+        """Report the collected durations and return them."""
+        for stage, seconds in self.timings.items():
+            self.histogram.labels(stage).observe(seconds)
+        return dict(self.timings)
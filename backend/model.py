@@ -1,18 +1,56 @@
-from langchain_community.embeddings import OllamaEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, UnstructuredMarkdownLoader, UnstructuredFileLoader
-from langchain.chains import RetrievalQA
-from langchain_community.llms import Ollama
-from typing import List, Dict, Any
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain.prompts import PromptTemplate
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseLLM
+from manifest import DocumentManifest, chunk_id
+from embedding_pipeline import CachedBatchEmbeddings, EmbeddingCache
+from cache import AnswerCache, TTLLRUCache, quantize
+from bm25 import BM25Index, MappedBM25Index, reciprocal_rank_fusion
+from concurrent.futures import ThreadPoolExecutor
+from loaders import iter_loaded_files
+from chunking import StructuredChunker
+from index_factory import (MAX_TOMBSTONE_RATIO, apply_storage, build_index, enable_reconstruct, evaluate_index,
+                           exceeds_trained_range, factory_string, read_index, remove_vectors, removes_in_place, set_search_params,
+                           spec_outgrown, tombstone_search_params)
+from snapshots import IndexSnapshot, ShardedSnapshot, SnapshotStore
+from sessions import ChatSession
+from chunk_store import ChunkOverlay, ChunkStore
+from context import ContextPacker
+from rerank import Reranker
+from batcher import MicroBatcher
+from metrics import (INGEST_STAGE_SECONDS, INGEST_CHUNKS, QUERY_STAGE_SECONDS, GENERATION_TOKENS_PER_SECOND,
+                     CONTEXT_TOKENS, QUERIES, QUERY_BATCH_SIZE, StageTimer)
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple, Union
+import numpy as np
+import threading
 import logging
+import time
+import faiss
 import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Answer given without asking the LLM when no chunk is relevant enough to put in the prompt
+NO_SOURCES_ANSWER = "I could not find anything in the documents that answers this question."
+
 class RAGModel:
-    def __init__(self, data_dir: str, base_url: str = "http://ollama:11434", vector_store_path: str = "/app/vector_store"):
+    def __init__(self, data_dir: str, base_url: str = "http://ollama:11434", vector_store_path: str = "/app/vector_store",
+                 embed_batch_size: int = 32, embed_max_in_flight: int = 4,
+                 answer_cache_size: int = 1024, answer_cache_ttl: float = 3600.0,
+                 answer_cache_similarity: float = 0.95, question_cache_size: int = 1024,
+                 retrieval_cache_size: int = 4096, hybrid_search: bool = True,
+                 index_spec: str = "Flat", vector_storage: str = "float32", nprobe: int = 8, ef_search: int = 64,
+                 loader_workers: int = 4, snapshots_kept: int = 3, context_token_budget: int = 1500,
+                 rerank: bool = True, rerank_fetch_k: int = 50, rerank_cutoff: float = 0.5,
+                 rerank_min_score: float = 0.5,
+                 query_batch_window_ms: float = 0.0, query_batch_size: int = 32,
+                 chunk_tokens: int = 256, chunk_overlap_tokens: int = 32,
+                 condense_followups: bool = True, session_reuse_similarity: float = 0.9,
+                 embeddings: Optional[Embeddings] = None, llm: Optional[BaseLLM] = None,
+                 recursive: bool = True, embedding_cache_path: Optional[str] = None, read_only: bool = False):
         """
         Initialize the RAG model with necessary components.
         
@@ -20,98 +58,498 @@ class RAGModel:
             data_dir (str): Directory containing company documents.
             base_url (str): URL for Ollama service.
             vector_store_path (str): Path to save/load the FAISS vector store.
+            embed_batch_size (int): Chunks per embedding batch during ingestion.
+            embed_max_in_flight (int): Maximum concurrent batches sent to the embedding server.
+            answer_cache_size (int): Answers kept per cache tier. 0 disables the answer cache.
+            answer_cache_ttl (float): Seconds a cached answer stays valid.
+            answer_cache_similarity (float): Cosine similarity needed for a semantic cache hit.
+                0 disables the semantic tier.
+            question_cache_size (int): Question texts whose embeddings are kept. 0 disables it.
+            retrieval_cache_size (int): Vector search results kept per question embedding,
+                index version and k. 0 disables it.
+            hybrid_search (bool): Fuse BM25 keyword hits with vector hits at query time.
+            index_spec (str): FAISS index_factory string, e.g. "Flat", "IVF,Flat",
+                "IVF4096,PQ32" or "HNSW32". Trained on the corpus during ingestion.
+            vector_storage (str): Encoding of the stored vectors: "float32", or "fp16" / "int8"
+                scalar quantization for a 2x / 4x smaller index.
+            nprobe (int): IVF lists visited per query.
+            ef_search (int): HNSW candidate list size per query.
+            loader_workers (int): Processes used to parse documents during ingestion.
+            snapshots_kept (int): Index versions kept on disk under vector_store_path.
+            context_token_budget (int): Maximum tokens of retrieved context in a prompt.
+                0 disables the budget.
+            rerank (bool): Over-fetch candidates and re-rank them instead of fusing ranks.
+            rerank_fetch_k (int): Vector candidates fetched for re-ranking.
+            rerank_cutoff (float): Minimum relevance, relative to the best candidate, for a
+                chunk to reach the prompt.
+            rerank_min_score (float): Minimum cosine similarity to the question for a chunk
+                to reach the prompt. A question no chunk reaches it for is answered as not
+                found without calling the LLM. 0 disables the floor.
+            query_batch_window_ms (float): How long a question waits for concurrent questions
+                to share its embedding and index search calls. 0 disables micro-batching.
+            query_batch_size (int): Most questions per micro-batch.
+            chunk_tokens (int): Maximum tokens per chunk.
+            chunk_overlap_tokens (int): Tokens shared by consecutive chunks of a long section.
+            condense_followups (bool): Rewrite questions asked within a chat session into
+                standalone queries with the LLM before retrieval.
+            session_reuse_similarity (float): Cosine similarity between a follow-up query and
+                the previous one at which the previous chunks are reused instead of searching
+                again. 0 always searches.
+            embeddings (Optional[Embeddings]): Embeddings client used instead of Ollama's
+                nomic-embed-text, e.g. a deterministic stand-in for benchmarks.
+            llm (Optional[BaseLLM]): LLM used instead of Ollama's mistral.
+            recursive (bool): Index files in subdirectories of data_dir too.
+            embedding_cache_path (Optional[str]): SQLite embedding cache, shared between
+                models of the same embedding model. Defaults to one inside vector_store_path.
+            read_only (bool): Only serve the snapshots another process publishes under
+                vector_store_path, as a query replica does: nothing is created there and
+                the embedding cache is only read.
         """
         self.data_dir = data_dir
+        self.recursive = recursive
         self.vector_store_path = vector_store_path
         
         # Ensure directories exist
         os.makedirs(self.data_dir, exist_ok=True)
-        os.makedirs(self.vector_store_path, exist_ok=True)
+        if not read_only:
+            os.makedirs(self.vector_store_path, exist_ok=True)
 
         logger.info(f"Using DOCUMENTS_DIR: {self.data_dir}")
         logger.info(f"Using VECTOR_STORE_PATH: {self.vector_store_path}")
 
-        # Initialize embeddings model
-        logger.info("Initializing embedding model...")
-        self.embeddings = OllamaEmbeddings(
-            model="nomic-embed-text",
-            base_url=base_url
+        # Clients are created on first use: a replica serving a published index
+        # needs neither until a question arrives, and the Ollama client stack is
+        # slow to import.
+        self.base_url = base_url
+        embedding_model = "nomic-embed-text" if embeddings is None else type(embeddings).__name__
+        self.embeddings = CachedBatchEmbeddings(
+            embeddings or self._create_embeddings,
+            model_name=embedding_model,
+            cache=EmbeddingCache(embedding_cache_path or os.path.join(self.vector_store_path, "embedding_cache.sqlite"),
+                                 read_only=read_only),
+            batch_size=embed_batch_size,
+            max_in_flight=embed_max_in_flight,
         )
-        
-        # Initialize LLM
-        logger.info("Initializing LLM...")
-        self.llm = Ollama(
-            model="mistral",
-            base_url=base_url,
-            temperature=0.5
+        self._llm: Optional[BaseLLM] = llm
+        self._llm_lock = threading.Lock()
+
+        # Chunk offsets let overlapping neighbours be merged back in the prompt
+        self.chunker = StructuredChunker(chunk_tokens=chunk_tokens, overlap_tokens=chunk_overlap_tokens)
+        self.context_packer = ContextPacker(token_budget=context_token_budget)
+        self.condense_followups = condense_followups
+        self.session_reuse_similarity = session_reuse_similarity
+        self.condense_prompt = PromptTemplate(
+            input_variables=["history", "question"],
+            template="Given the conversation below and a follow-up question, rewrite the follow-up as a standalone question that can be understood without the conversation. Reply with the question only.\n\nConversation:\n{history}\n\nFollow-up question: {question}\n\nStandalone question:",
+        )
+
+        self.top_k = 5
+        self.hybrid_search = hybrid_search
+        # Candidates taken from each retriever before reciprocal rank fusion
+        self.fusion_fetch_k = 20
+        self.rrf_k = 60
+        self.rerank = rerank
+        self.rerank_fetch_k = rerank_fetch_k
+        self.reranker = Reranker(cutoff=rerank_cutoff, min_score=rerank_min_score)
+        self._shard_pool: Optional[ThreadPoolExecutor] = None
+        # Concurrent questions share one embedding step and one stacked index search
+        self.embed_batcher = MicroBatcher(self._embed_questions, query_batch_window_ms, query_batch_size)
+        self.search_batcher = MicroBatcher(self._search_vectors, query_batch_window_ms, query_batch_size)
+        self.index_spec = index_spec
+        apply_storage(index_spec, vector_storage)  # Reject unknown encodings early
+        self.vector_storage = vector_storage
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.loader_workers = loader_workers
+        self.last_ingest_report: Dict[str, Any] = {}
+        self._ingest_lock = threading.Lock()
+        self.prompt = None
+
+        # Queries read whatever snapshot is current when they start; ingestion
+        # builds a new one and swaps the reference, so readers never wait.
+        self.snapshots = SnapshotStore(self.vector_store_path, keep=snapshots_kept, read_only=read_only)
+        self.snapshot: Optional[IndexSnapshot] = None
+
+        # Cached answers are tied to the index version they were produced from
+        self.answer_cache = AnswerCache(
+            maxsize=answer_cache_size,
+            ttl=answer_cache_ttl,
+            similarity_threshold=answer_cache_similarity,
         )
+        # Questions repeat across sessions; their embeddings do not depend on the index
+        self.question_cache = TTLLRUCache(question_cache_size)
+        # Vector positions are only meaningful within one index version
+        self.retrieval_cache = TTLLRUCache(retrieval_cache_size)
+
+    @property
+    def vector_store(self) -> Optional[FAISS]:
+        """Vector store of the current snapshot."""
+        snapshot = self.snapshot
+        return snapshot.vector_store if snapshot else None
+
+    @property
+    def bm25(self) -> Optional[Union[BM25Index, MappedBM25Index]]:
+        """BM25 index of the current snapshot."""
+        snapshot = self.snapshot
+        return snapshot.bm25 if snapshot else None
+
+    @property
+    def index_version(self) -> Optional[str]:
+        """Version of the current snapshot."""
+        snapshot = self.snapshot
+        return snapshot.version if snapshot else None
+
+    def _create_embeddings(self) -> Embeddings:
+        from langchain_community.embeddings import OllamaEmbeddings
+
+        logger.info("Initializing embedding model...")
+        return OllamaEmbeddings(model="nomic-embed-text", base_url=self.base_url)
+
+    @property
+    def llm(self) -> BaseLLM:
+        """LLM answering the questions; Ollama's mistral unless one was given."""
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    from langchain_community.llms import Ollama
+
+                    logger.info("Initializing LLM...")
+                    self._llm = Ollama(model="mistral", base_url=self.base_url, temperature=0.5)
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm: BaseLLM) -> None:
+        self._llm = llm
+
+    def _split_documents(self, rel_path: str, content_hash: str, documents: List[Document]) -> Iterator[Document]:
+        """Yield the chunks of one file, tagging each with a deterministic ID."""
+        fingerprint = self.chunker.fingerprint
+        for i, chunk in enumerate(self.chunker.split(documents)):
+            chunk.metadata["chunk_id"] = chunk_id(rel_path, content_hash, i, fingerprint)
+            chunk.metadata["chunk_index"] = i
+            yield chunk
+
+    def _index_settings(self) -> Dict[str, Any]:
+        """Settings recorded in the manifest; changing any of them rebuilds the index."""
+        settings = {"index_spec": self.index_spec}
+        if self.vector_storage != "float32":
+            # Only recorded when set, so existing float32 indexes stay current
+            settings["vector_storage"] = self.vector_storage
+        return settings
+
+    def _manifest_settings(self) -> Dict[str, Any]:
+        """Index settings plus the chunker's; a chunker change re-splits files instead of rebuilding."""
+        return dict(self._index_settings(), chunker=self.chunker.settings)
 
-        if not self.llm:
-            logger.warning("LLM Initialization not Successful...")
+    def is_index_current(self) -> bool:
+        """
+        Check whether the saved vector store matches the documents directory.
+
+        Only files whose size or mtime differ from the manifest are re-hashed, so
+        this is cheap when nothing changed.
+        """
+        path = self.snapshots.current_path()
+        manifest = DocumentManifest.load(path)
+        if not manifest.files or not os.path.exists(os.path.join(path, "index.faiss")) or not ChunkStore.exists(path):
+            return False
+        if manifest.settings != self._manifest_settings():
+            return False
+        if manifest.built_spec is None or spec_outgrown(self.index_spec, manifest.built_spec,
+                                                        len(manifest.all_chunk_ids()), self.vector_storage):
+            return False
+        added, changed, removed = manifest.diff(manifest.scan(self.data_dir, self.recursive))
+        return not (added or changed or removed)
+
+    @staticmethod
+    def _stored_chunks(vector_store: Optional[FAISS], exclude: List[str]) -> List[Document]:
+        """Return the chunks held by a vector store, minus the excluded IDs."""
+        if vector_store is None:
+            return []
+        excluded = set(exclude)
+        chunks = []
+        for cid in vector_store.index_to_docstore_id.values():
+            if cid in excluded:
+                continue
+            doc = vector_store.docstore.search(cid)
+            if isinstance(doc, Document):
+                chunks.append(doc)
+        return chunks
+
+    def _build_vector_store(self, chunks: List[Document],
+                            progress: Optional[Callable[[int], None]] = None) -> Tuple[FAISS, str]:
+        """
+        Build a new vector store over chunks using the configured index spec.
+
+        Embeddings come through the cached embedding stage, so rebuilding over
+        chunks that were embedded before costs no embedding requests.
+
+        Returns:
+            Tuple[FAISS, str]: The vector store and the index_factory string it was built with.
+        """
+        vectors = np.asarray(self.embeddings.embed_documents([c.page_content for c in chunks], progress=progress),
+                             dtype=np.float32)
+        built = factory_string(self.index_spec, len(vectors), self.vector_storage)
+        index = build_index(built, vectors)
+        vector_store = FAISS(self.embeddings, index, InMemoryDocstore(), {})
+        self._add_to_store(vector_store, chunks, vectors)
+        if not isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+            set_search_params(index, self.nprobe, self.ef_search)
+            stats = evaluate_index(index, vectors, k=self.top_k)
+            logger.info(f"Index {built} over {len(chunks)} chunks: {stats}")
+        return vector_store, built
+
+    def _add_chunks(self, vector_store: FAISS, bm25: BM25Index, chunks: List[Document],
+                    progress: Callable[[int], None]) -> Tuple[float, bool]:
+        """
+        Embed chunks into a vector store and BM25 index.
+
+        Returns:
+            Tuple[float, bool]: The seconds spent embedding, and whether the index's
+            scalar quantizer clipped the vectors, so it needs retraining.
+        """
+        vectors = self.embeddings.embed_documents([c.page_content for c in chunks], progress=progress)
+        clipped = exceeds_trained_range(vector_store.index, vectors)
+        self._add_to_store(vector_store, chunks, vectors)
+        for chunk in chunks:
+            bm25.add(chunk.metadata["chunk_id"], chunk.page_content)
+        return self.embeddings.last_stats.get("seconds", 0.0), clipped
+
+    @staticmethod
+    def _add_to_store(vector_store: FAISS, chunks: List[Document], vectors: List[List[float]]) -> None:
+        """
+        Add chunks with their vectors to a vector store, like add_embeddings.
+
+        New vectors take the positions after the index's last one, which is not
+        len(index_to_docstore_id) once an HNSW index holds tombstones.
+        """
+        start = vector_store.index.ntotal
+        vector_store.index.add(np.asarray(vectors, dtype=np.float32))
+        vector_store.docstore.add({c.metadata["chunk_id"]: c for c in chunks})
+        vector_store.index_to_docstore_id.update((start + i, c.metadata["chunk_id"]) for i, c in enumerate(chunks))
+
+    @staticmethod
+    def _delete_from_store(vector_store: FAISS, chunk_ids: List[str]) -> None:
+        """
+        Delete chunks from a vector store, like FAISS.delete.
+
+        Flat-code and IVF indexes drop the vectors and renumber the rest. An HNSW
+        index keeps them as tombstones: their positions leave index_to_docstore_id
+        and are excluded from searches once the snapshot is published.
+        """
+        deleted = set(chunk_ids)
+        mapping = vector_store.index_to_docstore_id
+        positions = np.asarray(sorted(p for p, cid in mapping.items() if cid in deleted), dtype=np.int64)
+        vector_store.docstore.delete(list(deleted))
+        if remove_vectors(vector_store.index, positions):
+            remaining = [cid for _, cid in sorted(mapping.items()) if cid not in deleted]
+            vector_store.index_to_docstore_id = dict(enumerate(remaining))
         else:
-            logger.info("LLM Initialization is Successful...")
+            for position in positions.tolist():
+                del mapping[position]
+
+    def _guess_built_spec(self, index: faiss.Index) -> str:
+        """Factory string of an index saved before manifests recorded it."""
+        if isinstance(faiss.downcast_index(index), (faiss.IndexFlat, faiss.IndexScalarQuantizer)):
+            return apply_storage("Flat", self.vector_storage)
+        return factory_string(self.index_spec, index.ntotal, self.vector_storage, warn=False)
+
+    def _copy_vector_store(self, snapshot: IndexSnapshot) -> FAISS:
+        """Private copy of a snapshot's vector store that ingestion can modify."""
+        vector_store = snapshot.vector_store
+        # A serialization round trip owns its codes; clone_index would share the
+        # read-only mapping of a memory-mapped index and crash on the first edit
+        index = faiss.deserialize_index(faiss.serialize_index(vector_store.index))
+        # Chunks stay on disk; only added and deleted IDs are tracked in memory
+        return FAISS(self.embeddings, index, ChunkOverlay(vector_store.docstore), dict(vector_store.index_to_docstore_id))
+
+    def load_and_process_documents(self, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Bring the vector store in line with the documents directory.
+
+        Only files that are new or whose content hash changed since the last run
+        are loaded, split and embedded. Vectors of changed and removed files are
+        deleted; everything else is left untouched. Index types that cannot
+        delete vectors in place are rebuilt from the stored chunks instead.
 
-        self.vector_store = None
-        self.qa_chain = None
+        Changes are applied to a copy of the current snapshot, written to a new
+        version directory and published atomically; queries in flight keep using
+        the snapshot they started with. Concurrent calls are serialized.
 
+        Args:
+            progress (Optional[Callable]): Receives progress updates with the stage
+                ("parsing", "embedding", "saving"), files parsed and chunks embedded.
+
+        Returns:
+            Dict[str, Any]: The ingestion report, also kept in last_ingest_report.
+        """
+        with self._ingest_lock:
+            return self._load_and_process_documents(progress or (lambda update: None))
 
-    def load_and_process_documents(self) -> None:
-        """Load documents from directory and create vector store."""
+    def _load_and_process_documents(self, progress: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
         try:
-            logger.info("Loading documents from directory...")
-
-            # Load PDF, txt, and markdown files
-            pdf_loader = DirectoryLoader(self.data_dir, glob="**/*.pdf", loader_cls=PyPDFLoader)
-            txt_loader = DirectoryLoader(
-                self.data_dir,
-                glob="**/*.txt",
-                loader_cls=UnstructuredFileLoader,
-                loader_kwargs={'mode': "single"}
-            )
-            md_loader = DirectoryLoader(
-                self.data_dir, 
-                # glob="**/*.{md,markdown}", 
-                glob="**/*.md", 
-                loader_cls=UnstructuredMarkdownLoader,
-                loader_kwargs={'mode': "single"}
-            )
+            logger.info("Scanning documents directory...")
+            if self.snapshot is None:
+                self.load_vector_store()
+            base = self.snapshot
+            manifest = DocumentManifest.load(base.path) if base else DocumentManifest()
 
-            pdf_documents = pdf_loader.load()
-            logger.info(f"Loaded {len(pdf_documents)} pdf documents")
-            txt_documents = txt_loader.load()
-            logger.info(f"Loaded {len(txt_documents)} txt documents")
-            md_documents = md_loader.load()
-            logger.info(f"Loaded {len(md_documents)} markdown documents")
+            previous_settings = dict(manifest.settings)
+            previous_chunker = previous_settings.pop("chunker", None)
+            rebuild = bool(manifest.files) and previous_settings != self._index_settings()
+            if rebuild:
+                logger.info(f"Index settings changed from {previous_settings} to {self._index_settings()}. Rebuilding index.")
+            manifest.settings = self._manifest_settings()
 
-            documents = pdf_documents + txt_documents + md_documents
+            current = manifest.scan(self.data_dir, self.recursive)
+            added, changed, removed = manifest.diff(current)
+            if manifest.files and previous_chunker != self.chunker.settings:
+                # Chunks depend on the chunker; every indexed file is split again
+                logger.info(f"Chunker changed from {previous_chunker} to {self.chunker.settings}. Re-splitting all files.")
+                changed = [p for p in current if p in manifest.files]
+            previous_ids = {p: manifest.chunk_ids([p]) for p in changed}
+            logger.info(f"Documents: {len(added)} added, {len(changed)} changed, "
+                        f"{len(removed)} removed, {len(current) - len(added) - len(changed)} unchanged")
 
-            if not documents:
-                logger.warning("No documents found in the directory. Skipping vector store creation.")
-                return
+            timer = StageTimer(INGEST_STAGE_SECONDS)
+            texts = []
+            failed = {}
+            status = {"stage": "parsing", "files_total": len(added + changed), "files_parsed": 0,
+                      "chunks_total": 0, "chunks_embedded": 0}
 
-            logger.info(f"Loaded {len(documents)} documents:")
-            logger.info(f"- PDF files: {len(pdf_documents)}")
-            logger.info(f"- Text files: {len(txt_documents)}")
-            logger.info(f"- Markdown files: {len(md_documents)}")
+            def embedded(count: int) -> None:
+                status["chunks_embedded"] = count
+                progress(status)
 
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=500,
-                chunk_overlap=100,
-                length_function=len,
-                is_separator_regex=False,
-            )
-            texts = text_splitter.split_documents(documents)
-            logger.info(f"Split into {len(texts)} text chunks.")
+            # Updating an index in place, each file's chunks are embedded and added as
+            # the file is parsed; only a build or rebuild needs every chunk at once
+            in_place = base is not None and not rebuild
+            vector_store = bm25 = None
+            chunks_added = 0
+            clipped = False
+            embed_seconds = stream_seconds = 0.0
+            parse_started = time.perf_counter()
+            progress(status)
+            for rel_path, documents, error in iter_loaded_files(self.data_dir, added + changed, self.loader_workers):
+                status["files_parsed"] += 1
+                progress(status)
+                if error is not None:
+                    # Keep whatever was indexed for this file before; it is retried next run
+                    logger.error(f"Failed to parse {rel_path}: {error}")
+                    failed[rel_path] = error
+                    continue
+                with timer.stage("split"):
+                    chunks = list(self._split_documents(rel_path, current[rel_path]["sha256"], documents))
+                manifest.files[rel_path] = dict(current[rel_path], chunk_ids=[c.metadata["chunk_id"] for c in chunks])
+                if not in_place:
+                    texts.extend(chunks)
+                elif chunks:
+                    started = time.perf_counter()
+                    if vector_store is None:
+                        vector_store, bm25 = self._copy_vector_store(base), base.bm25.copy()
+                    status["chunks_total"] += len(chunks)
+                    done = status["chunks_embedded"]
+                    seconds, file_clipped = self._add_chunks(vector_store, bm25, chunks,
+                                                             lambda count: embedded(done + count))
+                    embed_seconds += seconds
+                    clipped = clipped or file_clipped
+                    chunks_added += len(chunks)
+                    stream_seconds += time.perf_counter() - started
+
+            # Parsing runs in worker processes; time not spent splitting or adding chunks is spent waiting on them
+            timer.add("load", time.perf_counter() - parse_started - timer.timings.get("split", 0.0) - stream_seconds)
+            chunks_added += len(texts)
+            stale_ids = manifest.chunk_ids(removed) + [i for p in changed if p not in failed for i in previous_ids[p]]
+            for rel_path in removed:
+                del manifest.files[rel_path]
+            for rel_path, entry in current.items():
+                if rel_path not in failed:
+                    manifest.files[rel_path].update(entry)
+
+            # A spec that fell back to a flat index while the corpus was small is built once it can be trained
+            if base is not None and manifest.built_spec is None:
+                manifest.built_spec = self._guess_built_spec(base.vector_store.index)
+            n_chunks = len(manifest.all_chunk_ids())
+            if (base is not None and not rebuild and n_chunks
+                    and spec_outgrown(self.index_spec, manifest.built_spec, n_chunks, self.vector_storage)):
+                logger.info(f"Index {manifest.built_spec} does not fit {self.index_spec} over {n_chunks} chunks. "
+                            f"Rebuilding index.")
+                rebuild = True
+            if clipped and not rebuild:
+                # The streamed copy holds clipped codes; the rebuild embeds the chunks again from the cache
+                logger.info(f"New vectors fall outside the range {manifest.built_spec} was trained on. Rebuilding index.")
+                rebuild = True
+            self.last_ingest_report = {
+                "added": len(added),
+                "changed": len(changed),
+                "removed": len(removed),
+                "chunks_added": chunks_added,
+                "chunks_removed": len(stale_ids),
+                "failed": failed,
+            }
+
+            if not (chunks_added or stale_ids or rebuild):
+                if not current:
+                    logger.warning("No documents found in the directory. Skipping vector store creation.")
+                else:
+                    logger.info("Vector store is up to date.")
+                if base:
+                    # Only file stats changed; refresh them in place
+                    manifest.save(base.path)
+                return self.last_ingest_report
+
+            if base is not None and stale_ids and not removes_in_place(base.vector_store.index):
+                # Deleted HNSW vectors stay in the graph as tombstones until there are too many
+                index = base.vector_store.index
+                tombstones = index.ntotal - len(base.vector_store.index_to_docstore_id) + len(stale_ids)
+                if tombstones > MAX_TOMBSTONE_RATIO * (index.ntotal + chunks_added):
+                    logger.info(f"{tombstones} of {index.ntotal + chunks_added} index positions would be "
+                                f"tombstones. Rebuilding index.")
+                    rebuild = True
 
-            # Log a sample of the chunks to verify content
-            # if texts:
-            #     logger.info(f"Sample chunk content: {texts[0].page_content[:200]}...")
+            status.update(stage="embedding", parse_seconds=time.perf_counter() - parse_started)
+            index_started = time.perf_counter()
+            if rebuild or base is None:
+                # Chunks added in place so far are read back from the copy they went into
+                stored = vector_store if vector_store is not None else base.vector_store if base else None
+                chunks = self._stored_chunks(stored, exclude=stale_ids) + texts
+                status["chunks_total"] = len(chunks)
+                logger.info(f"Building vector store over {len(chunks)} chunks...")
+                vector_store, manifest.built_spec = self._build_vector_store(chunks, embedded) if chunks else (None, None)
+                embed_seconds += self.embeddings.last_stats.get("seconds", 0.0) if chunks else 0.0
+            else:
+                if vector_store is None:
+                    vector_store = self._copy_vector_store(base)
+                if chunks_added:
+                    logger.info(f"Added {chunks_added} new text chunks to vector store.")
+                if stale_ids:
+                    self._delete_from_store(vector_store, stale_ids)
+                    logger.info(f"Deleted {len(stale_ids)} stale chunks from vector store.")
+                if vector_store.index.ntotal == 0:
+                    # Withdrawn like a rebuild over no chunks, not published empty
+                    vector_store = None
 
-            logger.info("Creating vector store...")
-            self.vector_store = FAISS.from_documents(texts, self.embeddings)
+            if bm25 is None:
+                bm25 = base.bm25.copy() if base else BM25Index()
+            bm25.remove(stale_ids)
+            for chunk in texts:
+                bm25.add(chunk.metadata["chunk_id"], chunk.page_content)
+            timer.add("embed", embed_seconds)
+            timer.add("index", time.perf_counter() - index_started + stream_seconds - embed_seconds)
 
-            # Save the vector store for future use
-            self.save_vector_store()
+            status["stage"] = "saving"
+            progress(status)
+            if vector_store is None:
+                logger.warning("All documents were removed. The index is now empty.")
+                self.snapshots.unpublish()
+                self.snapshot = None
+            else:
+                with timer.stage("write"):
+                    self._publish_snapshot(vector_store, bm25, manifest)
+            self._index_changed()
+            INGEST_CHUNKS.inc(chunks_added)
+            self.last_ingest_report["timings"] = timer.observe()
+            logger.info(f"Ingestion stage timings: {self._format_timings(self.last_ingest_report['timings'])}")
+            return self.last_ingest_report
 
         except Exception as e:
             logger.error(f"Error processing documents: {str(e)}")
@@ -121,8 +559,9 @@ class RAGModel:
     def initialize_qa_chain(self) -> None:
         """Initialize the question-answering chain."""
         try:
-            # Try loading a saved vector store first
-            self.load_vector_store()
+            # Fall back to the saved vector store if ingestion has not produced one
+            if self.vector_store is None:
+                self.load_vector_store()
 
             if not self.vector_store:
                 raise ValueError("Vector store not initialized. Please load documents first.")
@@ -130,28 +569,12 @@ class RAGModel:
             # Log the number of documents in the vector store
             logger.info(f"Number of documents in vector store: {self.vector_store.index.ntotal}")
 
-            # Test the retriever with a sample query
-            # test_query = "What is the company's mission?"
-            # retrieved_docs = self.vector_store.similarity_search(test_query, k=5)
-            # logger.info(f"Retrieved documents for test query: {retrieved_docs}")
-
             # Define a custom prompt template
-            from langchain.prompts import PromptTemplate
-
-            custom_prompt = PromptTemplate(
+            self.prompt = PromptTemplate(
                 input_variables=["context", "question"],
                 template="Use the following context to answer the question. If you don't know the answer, say 'I don't know'.\n\nContext:\n{context}\n\nQuestion:\n{question}\n\nAnswer:",
             )
 
-            # Initialize the QA chain with custom prompt
-            self.qa_chain = RetrievalQA.from_chain_type(
-                llm=self.llm,
-                chain_type="stuff",
-                retriever=self.vector_store.as_retriever(search_kwargs={"k": 5}),
-                return_source_documents=True, 
-                chain_type_kwargs={"prompt": custom_prompt},
-            )
-
             logger.info("QA chain initialized successfully.")
 
         except Exception as e:
@@ -159,66 +582,538 @@ class RAGModel:
             raise
 
 
-    def get_answer(self, question: str) -> Dict[str, Any]:
-        """Get answer for a given question."""
+    def _index_changed(self) -> None:
+        """Invalidate everything derived from the previous snapshot."""
+        self.answer_cache.clear()
+        self.retrieval_cache.clear()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Answer cache counters, plus those of the question embedding and retrieval caches."""
+        return dict(self.answer_cache.stats(), question_embeddings=self.question_cache.stats(),
+                    retrieval=self.retrieval_cache.stats())
+
+    @staticmethod
+    def _format_timings(timings: Dict[str, float]) -> str:
+        return ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items())
+
+    def retrieve(self, question: str, embedding: Optional[List[float]] = None,
+                 snapshot: Optional[Union[IndexSnapshot, ShardedSnapshot]] = None,
+                 timer: Optional[StageTimer] = None) -> List[Document]:
+        """
+        Retrieve the chunks most relevant to a question.
+
+        Args:
+            question (str): The user's question.
+            embedding (Optional[List[float]]): Precomputed question embedding, if available.
+            snapshot (Optional[Union[IndexSnapshot, ShardedSnapshot]]): Snapshot to search;
+                defaults to the current one. A sharded snapshot is searched shard by shard
+                in parallel.
+            timer (Optional[StageTimer]): Receives the time spent re-ranking.
+        """
+        snapshot = snapshot or self.snapshot
+        if not self.prompt or snapshot is None:
+            raise ValueError("QA chain not initialized.")
+        if embedding is None:
+            embedding = self.embed_question(question)
+        if isinstance(snapshot, ShardedSnapshot):
+            return self._retrieve_sharded(question, embedding, snapshot, timer)
+        vector_store, bm25 = snapshot.vector_store, snapshot.bm25
+        if self.rerank:
+            return self._retrieve_reranked(question, embedding, snapshot, timer)
+        if not self.hybrid_search or not len(bm25):
+            return self._vector_search(snapshot, embedding, self.top_k)
+
+        # Hybrid retrieval: fuse vector and BM25 rankings with reciprocal rank fusion
+        vector_hits = self._vector_search(snapshot, embedding, self.fusion_fetch_k)
+        keyword_hits = bm25.search(question, k=self.fusion_fetch_k)
+        docs = {doc.metadata.get("chunk_id"): doc for doc in vector_hits}
+        fused = reciprocal_rank_fusion(
+            [list(docs), [cid for cid, _ in keyword_hits]],
+            k=self.rrf_k,
+        )
+
+        sources = []
+        for cid, _ in fused[:self.top_k]:
+            doc = docs.get(cid) or vector_store.docstore.search(cid)
+            if isinstance(doc, Document):
+                sources.append(doc)
+        return sources
+
+    def embed_question(self, question: str) -> List[float]:
+        """Embed a question, from the question cache or batched with concurrent questions."""
+        if self.question_cache.maxsize <= 0:
+            return self.embed_batcher.submit(None, question)
+        vector = self.question_cache.get(question)
+        if vector is None:
+            vector = np.asarray(self.embed_batcher.submit(None, question), dtype=np.float32)
+            self.question_cache.put(question, vector)
+        return vector.tolist()
+
+    def _embed_questions(self, _, questions: List[str]) -> List[List[float]]:
+        QUERY_BATCH_SIZE.labels("embed").observe(len(questions))
+        return self.embeddings.embed_queries(questions)
+
+    def _vector_search(self, snapshot: IndexSnapshot, embedding: List[float], k: int) -> List[Document]:
+        """The k chunks nearest to embedding, like similarity_search_by_vector."""
+        return [doc for _, doc in self._vector_hits(snapshot, embedding, k)]
+
+    def _vector_hits(self, snapshot: IndexSnapshot, embedding: List[float], k: int) -> List[Tuple[int, Document]]:
+        """
+        The k chunks nearest to embedding, with their positions in the index.
+
+        Results are cached per index version, k and quantized embedding. On a miss
+        the index search is batched with concurrent searches of the same index for
+        the same k.
+        """
+        vector_store = snapshot.vector_store
+        key = (snapshot.version, k, quantize(embedding))
+        positions = self.retrieval_cache.get(key) if self.retrieval_cache.maxsize > 0 else None
+        if positions is None:
+            positions = self.search_batcher.submit((snapshot, k), embedding)
+            self.retrieval_cache.put(key, positions)
+        hits = []
+        for position in positions:
+            if position == -1:
+                continue
+            cid = vector_store.index_to_docstore_id.get(position)
+            doc = vector_store.docstore.search(cid) if cid is not None else None
+            if isinstance(doc, Document):
+                hits.append((position, doc))
+        return hits
+
+    @staticmethod
+    def _search_vectors(key: Tuple[IndexSnapshot, int], embeddings: List[List[float]]) -> List[List[int]]:
+        """Search a stack of query vectors against one snapshot's index in a single call."""
+        snapshot, k = key
+        QUERY_BATCH_SIZE.labels("search").observe(len(embeddings))
+        _, positions = snapshot.vector_store.index.search(np.asarray(embeddings, dtype=np.float32), k,
+                                                          params=snapshot.search_params)
+        return positions.tolist()
+
+    def _retrieve_sharded(self, question: str, embedding: List[float], snapshot: ShardedSnapshot,
+                          timer: Optional[StageTimer]) -> List[Document]:
+        """
+        Gather candidates from every shard in parallel and rank their union once.
+
+        Each shard contributes its candidates with their stored vectors and BM25
+        scores, so chunks from different collections are compared on the same
+        scores rather than on their rank within their own collection. With
+        re-ranking the union is re-ranked, cutoff included, as one candidate set;
+        otherwise it is ordered by the relevance the re-ranker would blend.
+        """
+        if self._shard_pool is None:
+            self._shard_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="shard-search")
+        futures = [self._shard_pool.submit(self._shard_candidates, question, embedding, shard)
+                   for shard in snapshot.shards.values()]
+        docs, vectors, lexical, seen = [], [], [], set()
+        for future in futures:
+            shard_docs, shard_vectors, shard_lexical = future.result()
+            for doc, vector, score in zip(shard_docs, shard_vectors, shard_lexical):
+                cid = doc.metadata.get("chunk_id")
+                if cid not in seen:
+                    seen.add(cid)
+                    docs.append(doc)
+                    vectors.append(vector)
+                    lexical.append(score)
+        if not docs:
+            return []
+
+        started = time.perf_counter()
+        if self.rerank:
+            picked = self.reranker.rerank(embedding, vectors, lexical, self.top_k)
+        else:
+            relevance = self.reranker.relevance(np.asarray(embedding, dtype=np.float32), np.asarray(vectors),
+                                                np.asarray(lexical, dtype=np.float32))
+            picked = np.argsort(-relevance, kind="stable")[:self.top_k].tolist()
+        if timer is not None:
+            timer.add("rerank", time.perf_counter() - started)
+        return [docs[i] for i in picked]
+
+    def _shard_candidates(self, question: str, embedding: List[float],
+                          snapshot: IndexSnapshot) -> Tuple[List[Document], np.ndarray, np.ndarray]:
+        """
+        One shard's candidates for a sharded search, with their vectors and BM25 scores.
+
+        With re-ranking these are the shard's over-fetched re-ranking candidates;
+        otherwise the shard's own top_k results.
+        """
+        if self.rerank:
+            return self._rerank_candidates(question, embedding, snapshot)
+        vector_store, bm25 = snapshot.vector_store, snapshot.bm25
+        docs = self.retrieve(question, embedding, snapshot)
+        chunk_ids = [doc.metadata.get("chunk_id") for doc in docs]
+        vectors = self._candidate_vectors(vector_store, chunk_ids, docs, {})
+        if self.hybrid_search and len(bm25):
+            lexical = bm25.score(question, chunk_ids)
+        else:
+            lexical = np.zeros(len(docs), dtype=np.float32)
+        return docs, vectors, lexical
+
+    def _retrieve_reranked(self, question: str, embedding: List[float], snapshot: IndexSnapshot,
+                           timer: Optional[StageTimer]) -> List[Document]:
+        """Over-fetch vector (and keyword) candidates and keep the best after re-ranking."""
+        docs, vectors, lexical = self._rerank_candidates(question, embedding, snapshot)
+        started = time.perf_counter()
+        picked = self.reranker.rerank(embedding, vectors, lexical, self.top_k)
+        if timer is not None:
+            timer.add("rerank", time.perf_counter() - started)
+        return [docs[i] for i in picked]
+
+    def _rerank_candidates(self, question: str, embedding: List[float],
+                           snapshot: IndexSnapshot) -> Tuple[List[Document], np.ndarray, np.ndarray]:
+        """Vector (and keyword) candidates for re-ranking, with their vectors and BM25 scores."""
+        vector_store, bm25 = snapshot.vector_store, snapshot.bm25
+        hits = self._vector_hits(snapshot, embedding, self.rerank_fetch_k)
+        candidates = {doc.metadata.get("chunk_id"): doc for _, doc in hits}
+        positions = {doc.metadata.get("chunk_id"): position for position, doc in hits}
+        if self.hybrid_search:
+            for cid, _ in bm25.search(question, k=self.fusion_fetch_k):
+                if cid not in candidates:
+                    doc = vector_store.docstore.search(cid)
+                    if isinstance(doc, Document):
+                        candidates[cid] = doc
+        chunk_ids, docs = list(candidates), list(candidates.values())
+        vectors = self._candidate_vectors(vector_store, chunk_ids, docs, positions)
+        return docs, vectors, bm25.score(question, chunk_ids)
+
+    def _candidate_vectors(self, vector_store: FAISS, chunk_ids: List[str], docs: List[Document],
+                           positions: Dict[str, int]) -> np.ndarray:
+        """
+        Stored vectors of re-ranking candidates, reconstructed from the index.
+
+        Vector hits come with their positions and keyword hits are located through
+        the chunk store. Only candidates the index cannot return are read from the
+        embedding cache, which embeds what it does not hold.
+        """
+        docstore = vector_store.docstore
+        if isinstance(docstore, ChunkStore):
+            for cid in chunk_ids:
+                if cid not in positions:
+                    position = docstore.position_of(cid)
+                    if position is not None:
+                        positions[cid] = position
+        vectors = np.zeros((len(docs), vector_store.index.d), dtype=np.float32)
+        known = [i for i, cid in enumerate(chunk_ids) if cid in positions]
+        if known:
+            try:
+                vectors[known] = vector_store.index.reconstruct_batch(
+                    np.asarray([positions[chunk_ids[i]] for i in known], dtype=np.int64))
+            except RuntimeError as e:
+                logger.warning(f"Cannot reconstruct vectors from the index, using the embedding cache: {str(e)}")
+                known = []
+        missing = sorted(set(range(len(docs))) - set(known))
+        if missing:
+            vectors[missing] = self.embeddings.lookup([docs[i].page_content for i in missing])
+        return vectors
+
+    def build_prompt(self, question: str, sources: List[Document]) -> Tuple[str, Dict[str, int]]:
+        """
+        Pack the retrieved chunks into the prompt template.
+
+        Returns:
+            Tuple[str, Dict[str, int]]: The prompt and the context packing stats,
+            including the prompt tokens saved over plain concatenation.
+        """
+        packed = self.context_packer.pack(sources)
+        CONTEXT_TOKENS.labels("packed").observe(packed.stats["tokens_out"])
+        CONTEXT_TOKENS.labels("saved").observe(packed.stats["tokens_saved"])
+        logger.debug(f"Context packing: {packed.stats}")
+        return self.prompt.format(context=packed.text, question=question), packed.stats
+
+    def condense_question(self, question: str, session: ChatSession) -> str:
+        """
+        Rewrite a follow-up into a standalone retrieval query using the session history.
+
+        Returns the question unchanged when there is no history, or when the LLM
+        fails or answers with nothing usable.
+        """
+        history = session.history()
+        if not history:
+            return question
+        lines = []
+        for turn in history:
+            lines.append(f"User: {turn['query']}")
+            lines.append(f"Assistant: {turn['answer'][:300]}")
         try:
-            if not self.qa_chain:
-                raise ValueError("QA chain not initialized.")
+            condensed = self.llm.invoke(self.condense_prompt.format(history="\n".join(lines), question=question))
+        except Exception as e:
+            logger.warning(f"Could not condense follow-up question: {str(e)}")
+            return question
+        condensed = (condensed or "").strip().split("\n")[0].strip().strip('"')
+        return condensed or question
+
+    def _log_sources(self, sources: List[Document]) -> None:
+        if not sources:
+            logger.warning("No relevant documents retrieved.")
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Retrieved {len(sources)} documents:")
+            for doc in sources:
+                logger.debug(f"Document content: {doc.page_content[:200]}...")  # Log first 200 chars of each document
+                logger.debug(f"Document metadata: {doc.metadata}")
 
-            logger.info(f"Query passed to QA chain: {question}")
-            result = self.qa_chain({"query": question})
-            # logger.info(f"QA chain result: {result}")
+    def _prepare(self, question: str, timer: StageTimer,
+                 snapshot: Optional[Union[IndexSnapshot, ShardedSnapshot]] = None,
+                 session: Optional[ChatSession] = None):
+        """
+        Run the stages before generation: follow-up condensing, question embedding
+        and cache lookup, retrieval and prompt assembly.
 
-            # Extract the answer
-            answer = result.get("result", "No answer found.")
-            logger.info(f"Answer: {answer}")
+        Within a session the question is first rewritten into a standalone query,
+        which is what the caches, retrieval and the prompt see. If that query is
+        close to the previous one and the index is unchanged, the previous chunks
+        are reused without searching.
 
-            # Log retrieved sources
-            sources = result.get("source_documents", [])
-            if not sources:
-                logger.warning("No relevant documents retrieved.")
+        Cached answers are scoped to the version of the snapshot searched, so an
+        answer is never served from a different index version or collection set.
+
+        Returns:
+            Tuple: (cached result or None, standalone query, query embedding, snapshot,
+            sources, prompt, context packing stats).
+        """
+        snapshot = snapshot or self.snapshot
+        query = question
+        if session is not None and self.condense_followups:
+            with timer.stage("condense"):
+                query = self.condense_question(question, session)
+        scope = snapshot.version if snapshot else ""
+        with timer.stage("embed"):
+            cached, embedding = self.answer_cache.get(query, self.embed_question, scope=scope)
+            if cached is None and embedding is None:
+                # The answer cache is disabled and did not embed the question
+                embedding = self.embed_question(query)
+        if cached is not None:
+            return cached, query, embedding, snapshot, cached["sources"], None, None
+        sources = None
+        if session is not None:
+            sources = session.reusable_sources(embedding, scope, self.session_reuse_similarity)
+            if sources is not None:
+                logger.debug("Follow-up reuses the chunks of the previous question")
+        if sources is None:
+            with timer.stage("search"):
+                sources = self.retrieve(query, embedding, snapshot, timer)
+        self._log_sources(sources)
+        with timer.stage("prompt"):
+            prompt, context = self.build_prompt(query, sources)
+        return None, query, embedding, snapshot, sources, prompt, context
+
+    def _generate(self, prompt: str, timer: StageTimer) -> Iterator[str]:
+        """Stream tokens from the LLM, recording generation time and tokens/sec."""
+        started = time.perf_counter()
+        count = 0
+        for token in self.llm.stream(prompt):
+            count += 1
+            yield token
+        elapsed = time.perf_counter() - started
+        timer.add("generate", elapsed)
+        if count and elapsed > 0:
+            GENERATION_TOKENS_PER_SECOND.observe(count / elapsed)
+
+    def _finish(self, timer: StageTimer, started: float, outcome: str) -> Dict[str, float]:
+        timer.add("total", time.perf_counter() - started)
+        QUERIES.labels(outcome).inc()
+        timings = timer.observe()
+        logger.debug(f"Query stage timings: {self._format_timings(timings)}")
+        return timings
+
+    def get_answer(self, question: str, snapshot: Optional[Union[IndexSnapshot, ShardedSnapshot]] = None,
+                   session: Optional[ChatSession] = None) -> Dict[str, Any]:
+        """
+        Get answer for a given question.
+
+        Pass a sharded snapshot to answer from several collections at once, and a
+        session to answer follow-ups in the context of the chat. The answered
+        turn is recorded in the session; "query" holds the standalone question.
+
+        The result carries a "timings" breakdown in seconds per query stage
+        (embed, search, prompt, generate, total).
+        """
+        started = time.perf_counter()
+        timer = StageTimer(QUERY_STAGE_SECONDS)
+        try:
+            logger.debug(f"Query passed to QA chain: {question}")
+            cached, query, embedding, snapshot, sources, prompt, context = self._prepare(question, timer, snapshot, session)
+            if cached is not None:
+                logger.debug("Answer served from cache")
+                if session is not None:
+                    session.add_turn(question, cached["answer"], query, embedding, sources, snapshot.version)
+                return dict(cached, cached=True, query=query, timings=self._finish(timer, started, "cached"))
+
+            if sources:
+                answer = "".join(self._generate(prompt, timer)) or "No answer found."
             else:
-                logger.info(f"Retrieved {len(sources)} documents:")
-                for doc in sources:
-                    logger.info(f"Document content: {doc.page_content[:200]}...")  # Log first 200 chars of each document
-                    logger.info(f"Document metadata: {doc.metadata}")
-            return {
+                # Nothing passed re-ranking; the LLM would only guess without context
+                answer = NO_SOURCES_ANSWER
+            logger.debug(f"Answer: {answer}")
+
+            result = {
                 "answer": answer,
                 "sources": sources,
                 "status": "success"
             }
+            self.answer_cache.put(query, result, embedding, scope=snapshot.version)
+            if session is not None:
+                session.add_turn(question, answer, query, embedding, sources, snapshot.version)
+            return dict(result, query=query, context=context, timings=self._finish(timer, started, "answered"))
 
         except Exception as e:
             logger.error(f"Error getting answer: {str(e)}")
             return {
                 "answer": "Sorry, I encountered an error processing your question.",
                 "error": str(e),
-                "status": "error"
+                "status": "error",
+                "timings": self._finish(timer, started, "error"),
             }
 
+    def stream_answer(self, question: str, snapshot: Optional[Union[IndexSnapshot, ShardedSnapshot]] = None,
+                      session: Optional[ChatSession] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a question as a stream of events. Pass a sharded snapshot to answer
+        from several collections at once, and a session to answer follow-ups in
+        the context of the chat.
+
+        Yields a "sources" event with the metadata of the retrieved chunks and the
+        standalone query, then one "token" event per generated token, and finally
+        a "done" event. Failures end the stream with an "error" event.
+        """
+        started = time.perf_counter()
+        timer = StageTimer(QUERY_STAGE_SECONDS)
+        try:
+            logger.debug(f"Query passed to QA chain (streaming): {question}")
+            cached, query, embedding, snapshot, sources, prompt, context = self._prepare(question, timer, snapshot, session)
+            if cached is not None:
+                logger.debug("Answer served from cache")
+                if session is not None:
+                    session.add_turn(question, cached["answer"], query, embedding, sources, snapshot.version)
+                yield {"type": "sources", "sources": [doc.metadata for doc in sources], "query": query}
+                yield {"type": "token", "content": cached["answer"]}
+                self._finish(timer, started, "cached")
+                yield {"type": "done", "status": "success", "cached": True}
+                return
+
+            yield {"type": "sources", "sources": [doc.metadata for doc in sources], "query": query}
+
+            tokens = []
+            for token in self._generate(prompt, timer) if sources else [NO_SOURCES_ANSWER]:
+                tokens.append(token)
+                yield {"type": "token", "content": token}
+            result = {"answer": "".join(tokens), "sources": sources, "status": "success"}
+            self.answer_cache.put(query, result, embedding, scope=snapshot.version)
+            if session is not None:
+                # Recorded before "done" so the next question sees this turn
+                session.add_turn(question, result["answer"], query, embedding, sources, snapshot.version)
+            self._finish(timer, started, "answered")
+            yield {"type": "done", "status": "success", "context": context}
+
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            self._finish(timer, started, "error")
+            yield {"type": "error", "status": "error", "error": str(e)}
+
+
+    def _publish_snapshot(self, vector_store: FAISS, bm25: BM25Index, manifest: DocumentManifest) -> None:
+        """
+        Write a new index version, publish it and swap it in for queries.
 
-    def save_vector_store(self) -> None:
-        """Save the vector store for future use."""
+        Chunks already stored by the current snapshot are not written again. The
+        published snapshot reads chunk texts and BM25 postings from disk, so the
+        copies made during ingestion are released.
+        """
         try:
-            if self.vector_store:
-                self.vector_store.save_local(self.vector_store_path)
-                logger.info(f"Vector store saved to {self.vector_store_path}")
+            version = self.snapshots.create_version()
+            path = self.snapshots.version_path(version)
+            faiss.write_index(vector_store.index, os.path.join(path, "index.faiss"))
+            base = self.vector_store.docstore if self.vector_store is not None else None
+            ChunkStore.write(
+                path,
+                [vector_store.index_to_docstore_id.get(i) for i in range(vector_store.index.ntotal)],
+                vector_store.docstore.search,
+                base if isinstance(base, ChunkStore) else None,
+            )
+            bm25.save(path)
+            # The manifest goes last so it never claims chunks that are not persisted
+            manifest.save(path)
+            self.snapshots.publish(version)
+            chunk_store = ChunkStore(path)
+            enable_reconstruct(vector_store.index)
+            vector_store = FAISS(self.embeddings, vector_store.index, chunk_store, chunk_store.index_to_docstore_id)
+            self.snapshot = IndexSnapshot(version, path, vector_store, BM25Index.load(path),
+                                          tombstone_search_params(vector_store.index, chunk_store.tombstones))
+            logger.info(f"Vector store saved to {path}")
         except Exception as e:
             logger.error(f"Error saving vector store: {str(e)}")
             raise
 
-    def load_vector_store(self) -> None:
-        """Load a previously saved vector store."""
+    @staticmethod
+    def _build_bm25(vector_store: FAISS) -> BM25Index:
+        """Rebuild the BM25 index from the chunks in a vector store."""
+        logger.info("Building BM25 index from vector store...")
+        bm25 = BM25Index()
+        for cid in vector_store.index_to_docstore_id.values():
+            doc = vector_store.docstore.search(cid)
+            if isinstance(doc, Document):
+                bm25.add(cid, doc.page_content)
+        return bm25
+
+    def load_vector_store(self, mmap: bool = False) -> None:
+        """
+        Load the published snapshot of the vector store.
+
+        Chunk texts and metadata stay in the snapshot's chunk store on disk and
+        are decoded by ID when retrieval returns them, so loading takes about the
+        same time for any corpus size. Snapshots written by earlier releases kept
+        the chunks in a pickle; they are not loaded, and the next ingestion
+        rebuilds them from the documents and the embedding cache.
+
+        Args:
+            mmap (bool): Memory-map the FAISS index instead of reading it into RAM.
+                Used on the read-only fast-start path; index types that cannot be
+                mapped are read normally.
+        """
         try:
-            if os.path.exists(self.vector_store_path):
-                self.vector_store = FAISS.load_local(
-                    self.vector_store_path, 
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                logger.info(f"Vector store loaded from {self.vector_store_path}")
-            else:
-                logger.warning(f"No vector store found at {self.vector_store_path}.")
+            # Read the pointer once; another process may publish while this one loads
+            version = self.snapshots.current_version()
+            path = self.snapshots.version_path(version) if version else self.snapshots.root
+            index_path = os.path.join(path, "index.faiss")
+            if not os.path.exists(index_path):
+                logger.warning(f"No vector store found at {path}.")
+                return
+
+            chunk_store = ChunkStore.open(path)
+            if chunk_store is None:
+                logger.warning(f"Vector store at {path} was saved in the old pickle format. It will be rebuilt.")
+                return
+
+            index = read_index(index_path, mmap=mmap)
+            enable_reconstruct(index)
+            vector_store = FAISS(self.embeddings, index, chunk_store, chunk_store.index_to_docstore_id)
+            set_search_params(vector_store.index, self.nprobe, self.ef_search)
+            bm25 = BM25Index.load(path) or self._build_bm25(vector_store)
+            self.snapshot = IndexSnapshot(version or "legacy", path, vector_store, bm25,
+                                          tombstone_search_params(index, chunk_store.tombstones))
+            self._index_changed()
+            logger.info(f"Vector store loaded from {path}")
         except Exception as e:
             logger.error(f"Error loading vector store: {str(e)}")
             raise
+
+    def refresh(self) -> bool:
+        """
+        Swap in the published snapshot if another process has published a newer one.
+
+        Used by read-only query replicas. The new snapshot is memory-mapped;
+        queries in flight finish on the one they started with.
+
+        Returns:
+            bool: Whether the snapshot in memory changed.
+        """
+        version = self.snapshots.current_version()
+        if version == self.index_version:
+            return False
+        if version is None:
+            # Every document of the collection was removed
+            self.snapshot = None
+            self._index_changed()
+        else:
+            self.load_vector_store(mmap=True)
+        logger.info(f"Index of {self.vector_store_path} is now at version {self.index_version}")
+        return True
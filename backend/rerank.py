@@ -0,0 +1,93 @@
+from typing import List, Optional
+import numpy as np
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class Reranker:
+    """
+    Cheap CPU re-ranker for an over-fetched candidate set.
+
+    Each candidate's relevance blends the cosine similarity of its embedding to
+    the question with its BM25 score, scaled to the best candidate. Candidates
+    whose cosine similarity is below min_score are dropped whatever the others
+    score, so a question nothing matches gets no candidates; BM25 scores have
+    no absolute scale and cannot rescue them. Candidates below cutoff times the
+    best relevance are dropped too, and the rest are selected
+    with maximal marginal relevance so near-identical chunks do not crowd out
+    other evidence. All scoring is done on the candidate batch at once; cost is
+    bounded by the number of candidates, not the index size.
+    """
+
+    def __init__(self, lexical_weight: float = 0.3, cutoff: float = 0.5, mmr_lambda: float = 0.7,
+                 min_score: float = 0.0):
+        """
+        Args:
+            lexical_weight (float): Share of the BM25 score in the relevance, 0 to 1.
+            cutoff (float): Minimum relevance relative to the best candidate, 0 to 1.
+                0 keeps every candidate.
+            mmr_lambda (float): Trade-off between relevance (1.0) and diversity (0.0).
+            min_score (float): Minimum cosine similarity to the question, 0 to 1,
+                regardless of the other candidates. 0 keeps every candidate.
+        """
+        self.lexical_weight = lexical_weight
+        self.cutoff = cutoff
+        self.mmr_lambda = mmr_lambda
+        self.min_score = min_score
+
+    @staticmethod
+    def similarity(query_vector: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each candidate to the question, clipped to [0, 1]."""
+        return np.clip(_normalize_rows(vectors) @ _normalize_rows(query_vector), 0.0, 1.0)
+
+    def relevance(self, query_vector: np.ndarray, vectors: np.ndarray, lexical: np.ndarray) -> np.ndarray:
+        """Blended relevance of each candidate, roughly in [0, 1]."""
+        semantic = self.similarity(query_vector, vectors)
+        best_lexical = lexical.max() if len(lexical) else 0.0
+        lexical = lexical / best_lexical if best_lexical > 0 else np.zeros_like(semantic)
+        return (1.0 - self.lexical_weight) * semantic + self.lexical_weight * lexical
+
+    def rerank(self, query_vector: List[float], vectors: List[List[float]], lexical: List[float],
+               k: int) -> List[int]:
+        """
+        Pick up to k candidates.
+
+        Args:
+            query_vector (List[float]): Question embedding.
+            vectors (List[List[float]]): Candidate embeddings.
+            lexical (List[float]): Candidate BM25 scores for the question.
+            k (int): Maximum number of candidates to keep.
+
+        Returns:
+            List[int]: Indices of the selected candidates, in selection order; empty if
+            none reaches min_score.
+        """
+        if not len(vectors):
+            return []
+        vectors = np.asarray(vectors, dtype=np.float32)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        relevance = self.relevance(query_vector, vectors, np.asarray(lexical, dtype=np.float32))
+        eligible = np.flatnonzero((self.similarity(query_vector, vectors) >= self.min_score)
+                                  & (relevance >= self.cutoff * relevance.max()))
+        if len(eligible) <= 1 or self.mmr_lambda >= 1.0:
+            return eligible[np.argsort(-relevance[eligible])][:k].tolist()
+
+        unit = _normalize_rows(vectors[eligible])
+        similarity = unit @ unit.T
+        scores = relevance[eligible]
+        selected: List[int] = []
+        max_similarity: Optional[np.ndarray] = None
+        available = np.ones(len(eligible), dtype=bool)
+        for _ in range(min(k, len(eligible))):
+            mmr = self.mmr_lambda * scores
+            if max_similarity is not None:
+                mmr = mmr - (1.0 - self.mmr_lambda) * max_similarity
+            mmr = np.where(available, mmr, -np.inf)
+            pick = int(np.argmax(mmr))
+            selected.append(pick)
+            available[pick] = False
+            max_similarity = similarity[pick] if max_similarity is None else np.maximum(max_similarity, similarity[pick])
+        return eligible[selected].tolist()
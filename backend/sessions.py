@@ -0,0 +1,226 @@
+from collections import OrderedDict
+from langchain_core.documents import Document
+from typing import Any, Dict, List, Optional
+import numpy as np
+import threading
+import hashlib
+import logging
+import json
+import time
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ChatSession:
+    """
+    Conversation state of one chat, bounded in size.
+
+    Keeps the last max_turns questions with their answers (cut to
+    max_answer_chars) and the standalone query, embedding and sources of the
+    most recent retrieval, so a follow-up on the same documents can reuse them.
+    """
+
+    def __init__(self, session_id: str, max_turns: int = 5, max_answer_chars: int = 1000):
+        self.session_id = session_id
+        self.max_turns = max(1, max_turns)
+        self.max_answer_chars = max_answer_chars
+        self.turns: List[Dict[str, str]] = []
+        self.updated = time.time()
+        # Last retrieval: the scope (index version) it searched, its query embedding and sources
+        self.scope: Optional[str] = None
+        self.embedding: Optional[np.ndarray] = None
+        self.sources: List[Document] = []
+        self._lock = threading.Lock()
+
+    def history(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return list(self.turns)
+
+    def add_turn(self, question: str, answer: str, query: str, embedding: Optional[List[float]],
+                 sources: List[Document], scope: str) -> None:
+        """Record an answered question and the retrieval it was answered from."""
+        with self._lock:
+            self.turns.append({"question": question, "answer": answer[:self.max_answer_chars], "query": query})
+            del self.turns[:-self.max_turns]
+            if embedding is not None:
+                vector = np.asarray(embedding, dtype=np.float32)
+                self.embedding = vector / (np.linalg.norm(vector) or 1.0)
+                self.scope = scope
+                self.sources = list(sources)
+            self.updated = time.time()
+
+    def reusable_sources(self, embedding: List[float], scope: str, similarity: float) -> Optional[List[Document]]:
+        """
+        Sources of the previous retrieval if it searched the same index version and
+        its query embedding is at least similarity close (cosine) to embedding.
+        """
+        with self._lock:
+            if self.embedding is None or not self.sources or self.scope != scope or similarity <= 0:
+                return None
+            vector = np.asarray(embedding, dtype=np.float32)
+            if float(self.embedding @ (vector / (np.linalg.norm(vector) or 1.0))) < similarity:
+                return None
+            return list(self.sources)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "session_id": self.session_id,
+                "updated": self.updated,
+                "turns": self.turns,
+                "scope": self.scope,
+                "embedding": self.embedding.tolist() if self.embedding is not None else None,
+                "sources": [{"text": doc.page_content, "metadata": doc.metadata} for doc in self.sources],
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_turns: int = 5, max_answer_chars: int = 1000) -> "ChatSession":
+        session = cls(data["session_id"], max_turns, max_answer_chars)
+        session.turns = data.get("turns", [])[-session.max_turns:]
+        session.updated = data.get("updated", session.updated)
+        session.scope = data.get("scope")
+        if data.get("embedding") is not None:
+            session.embedding = np.asarray(data["embedding"], dtype=np.float32)
+        session.sources = [Document(page_content=s["text"], metadata=s["metadata"]) for s in data.get("sources", [])]
+        return session
+
+
+class SessionStore:
+    """
+    Server-side chat sessions keyed by the client's session ID.
+
+    At most max_sessions are kept in memory. The least recently used session
+    beyond that is written to spill_dir, if set, and read back when its chat
+    continues; without a spill directory it is dropped. Sessions idle for
+    longer than ttl seconds are forgotten, in memory and on disk.
+
+    A shared store keeps no sessions in memory: every question reads its
+    session from spill_dir and save writes it back, so replicas behind a load
+    balancer that mount the same directory continue each other's chats.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_turns: int = 5, max_answer_chars: int = 1000,
+                 ttl: float = 86400.0, spill_dir: Optional[str] = None, shared: bool = False):
+        """
+        Args:
+            max_sessions (int): Sessions kept in memory.
+            max_turns (int): Question/answer pairs remembered per session.
+            max_answer_chars (int): Characters of each answer remembered.
+            ttl (float): Seconds of inactivity after which a session is forgotten.
+            spill_dir (Optional[str]): Directory for sessions evicted from memory.
+                None drops them instead.
+            shared (bool): Read and write every session through spill_dir, which
+                other replicas share.
+        """
+        if shared and not spill_dir:
+            raise ValueError("A shared session store needs a spill directory")
+        self.max_sessions = max(1, max_sessions)
+        self.max_turns = max_turns
+        self.max_answer_chars = max_answer_chars
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.shared = shared
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        # Session IDs come from clients; never use them as file names directly
+        return os.path.join(self.spill_dir, hashlib.sha1(session_id.encode("utf-8")).hexdigest() + ".json")
+
+    def _expired(self, session: ChatSession) -> bool:
+        return time.time() - session.updated > self.ttl
+
+    def get(self, session_id: str) -> ChatSession:
+        """Return the session with this ID, creating it if it is unknown or expired."""
+        if self.shared:
+            # Another replica may have answered the last turn; the file is the session
+            return self._load(session_id) or ChatSession(session_id, self.max_turns, self.max_answer_chars)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self._expired(session):
+                session = None
+            if session is None:
+                session = self._load(session_id) or ChatSession(session_id, self.max_turns, self.max_answer_chars)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            evicted = []
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in evicted:
+            self._spill(old)
+        return session
+
+    def save(self, session: ChatSession) -> None:
+        """Write a session back after a question; only a shared store needs to."""
+        if self.shared:
+            self._spill(session)
+
+    def delete(self, session_id: str) -> None:
+        """Forget a session, e.g. when the user starts a new chat."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.spill_dir:
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def flush(self) -> None:
+        """Write every session in memory to the spill directory, e.g. before shutdown."""
+        if not self.spill_dir:
+            return
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            self._spill(session)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _load(self, session_id: str) -> Optional[ChatSession]:
+        if not self.spill_dir:
+            return None
+        path = self._path(session_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                session = ChatSession.from_dict(json.load(f), self.max_turns, self.max_answer_chars)
+            if not self.shared:
+                os.remove(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable session file {path}: {str(e)}")
+            return None
+        return None if self._expired(session) or session.session_id != session_id else session
+
+    def _spill(self, session: ChatSession) -> None:
+        if not self.spill_dir or self._expired(session) or not session.turns:
+            return
+        path = self._path(session.session_id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(session.to_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not spill session to {path}: {str(e)}")
+        self._prune()
+
+    def _prune(self) -> None:
+        """Delete spilled sessions past their ttl, at most every ten minutes."""
+        now = time.time()
+        if now - self._last_prune < 600:
+            return
+        self._last_prune = now
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
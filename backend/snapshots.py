@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional
+import logging
+import shutil
+import time
+import uuid
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Files of the pre-snapshot layout, written directly into the vector store directory
+LEGACY_FILES = ("index.faiss", "index.pkl", "bm25.json", "manifest.json")
+
+
+class IndexSnapshot:
+    """
+    One immutable version of the index as seen by queries.
+
+    Readers take a reference to the current snapshot once per query and use it
+    throughout, so swapping in a new snapshot never affects a query in flight.
+    """
+
+    def __init__(self, version: str, path: str, vector_store, bm25, search_params=None):
+        self.version = version
+        self.path = path
+        self.vector_store = vector_store
+        self.bm25 = bm25
+        # Passed to every index search, e.g. to skip tombstoned positions
+        self.search_params = search_params
+
+
+class ShardedSnapshot:
+    """Snapshots of several collections searched together by one query."""
+
+    def __init__(self, shards: Dict[str, IndexSnapshot]):
+        self.shards = shards
+        # Changes whenever any shard is republished; scopes cached answers
+        self.version = "+".join(f"{name}@{shard.version}" for name, shard in sorted(shards.items()))
+
+
+class SnapshotStore:
+    """
+    Versioned index snapshots on disk.
+
+    Every index update is written to a fresh directory under versions/ and only
+    then published by atomically replacing the CURRENT pointer file, so a reader
+    never sees a half-written index. Old versions are garbage-collected.
+    """
+
+    POINTER = "CURRENT"
+
+    def __init__(self, root: str, keep: int = 3, read_only: bool = False):
+        """
+        Args:
+            root (str): Vector store directory holding versions/ and CURRENT.
+            keep (int): Number of most recent versions kept on disk.
+            read_only (bool): Only read versions another process publishes; nothing is
+                created under root.
+        """
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.keep = max(1, keep)
+        if not read_only:
+            os.makedirs(self.versions_dir, exist_ok=True)
+
+    def current_version(self) -> Optional[str]:
+        """Return the published version, or None if nothing was published yet."""
+        try:
+            with open(os.path.join(self.root, self.POINTER), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current_path(self) -> str:
+        """
+        Directory of the published version.
+
+        Falls back to the vector store directory itself for indexes saved before
+        snapshots were introduced.
+        """
+        version = self.current_version()
+        return self.version_path(version) if version else self.root
+
+    def version_path(self, version: str) -> str:
+        return os.path.join(self.versions_dir, version)
+
+    def create_version(self) -> str:
+        """Create an empty directory for a new, unpublished version and return its name."""
+        # Time-ordered names keep versions sortable
+        version = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.version_path(version))
+        return version
+
+    def publish(self, version: str) -> None:
+        """Atomically make version the current one and collect old versions."""
+        pointer = os.path.join(self.root, self.POINTER)
+        tmp_pointer = f"{pointer}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pointer, pointer)
+        logger.info(f"Published index version {version}")
+        self.collect_garbage()
+
+    def unpublish(self) -> None:
+        """Withdraw the published version, e.g. after every document was removed."""
+        pointer = os.path.join(self.root, self.POINTER)
+        if os.path.exists(pointer):
+            os.remove(pointer)
+        for name in LEGACY_FILES:
+            legacy = os.path.join(self.root, name)
+            if os.path.exists(legacy):
+                os.remove(legacy)
+
+    def list_versions(self) -> List[str]:
+        """Versions on disk, oldest first."""
+        return sorted(v for v in os.listdir(self.versions_dir) if os.path.isdir(self.version_path(v)))
+
+    def collect_garbage(self) -> None:
+        """Delete all but the newest versions, never the current one."""
+        current = self.current_version()
+        if current is None:
+            return
+        versions = self.list_versions()
+        for version in versions[:-self.keep]:
+            if version != current:
+                shutil.rmtree(self.version_path(version), ignore_errors=True)
+        for name in LEGACY_FILES:
+            legacy = os.path.join(self.root, name)
+            if os.path.exists(legacy):
+                os.remove(legacy)
@@ -0,0 +1,51 @@
+"""
+Measure ingestion embedding throughput against an Ollama-compatible server.
+
+Start the fake server first (or point --base-url at a real Ollama):
+    python benchmarks/fake_ollama_server.py --latency-ms 20 &
+    python benchmarks/embedding_throughput.py --base-url http://127.0.0.1:11435 --chunks 2000
+
+The second pass runs against a warm cache and should embed nothing.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from langchain_community.embeddings import OllamaEmbeddings  # noqa: E402
+from embedding_pipeline import CachedBatchEmbeddings, EmbeddingCache  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:11435")
+    parser.add_argument("--model", default="nomic-embed-text")
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="Share of repeated boilerplate chunks")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    duplicates = int(args.chunks * args.duplicate_ratio)
+    texts = [f"synthetic chunk {i}: restart the service and check the logs" for i in range(args.chunks - duplicates)]
+    texts += ["Contact the on-call engineer if the issue persists."] * duplicates
+
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = CachedBatchEmbeddings(
+            OllamaEmbeddings(model=args.model, base_url=args.base_url),
+            model_name=args.model,
+            cache=EmbeddingCache(os.path.join(tmp, "embedding_cache.sqlite")),
+            batch_size=args.batch_size,
+            max_in_flight=args.max_in_flight,
+        )
+        for label in ("cold", "warm"):
+            embeddings.embed_documents(texts)
+            stats = embeddings.last_stats
+            print(f"{label}: {stats['chunks']} chunks, {stats['embedded']} embedded, "
+                  f"{stats['cached']} cached, {stats['chunks_per_sec']:.1f} chunks/sec")
+
+
+if __name__ == "__main__":
+    main()
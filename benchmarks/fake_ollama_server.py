@@ -0,0 +1,87 @@
+"""
+Minimal stand-in for the Ollama HTTP API, for exercising the backend without models.
+
+Embeddings are deterministic pseudo-random unit vectors derived from the prompt
+text, so identical text always gets the same vector. Generation streams a fixed
+number of placeholder tokens.
+
+Usage:
+    python benchmarks/fake_ollama_server.py --port 11435 --dim 768 --latency-ms 20
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hashlib
+import json
+import time
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int) -> list:
+    """Deterministic unit vector for a piece of text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def make_handler(dim: int, latency: float, tokens: int = 16):
+    class FakeOllamaHandler(BaseHTTPRequestHandler):
+        requests_served = 0
+
+        def _send_json(self, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_generation(self, model: str) -> None:
+            lines = [{"model": model, "response": f"token{i} ", "done": False} for i in range(tokens)]
+            lines.append({"model": model, "response": "", "done": True, "eval_count": tokens})
+            body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency)
+            FakeOllamaHandler.requests_served += 1
+
+            if self.path == "/api/embeddings":
+                self._send_json({"embedding": fake_embedding(payload.get("prompt", ""), dim)})
+            elif self.path == "/api/embed":
+                inputs = payload.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                self._send_json({"embeddings": [fake_embedding(t, dim) for t in inputs]})
+            elif self.path == "/api/generate":
+                self._send_generation(payload.get("model", ""))
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeOllamaHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial latency per request")
+    parser.add_argument("--tokens", type=int, default=16, help="Tokens streamed per generation")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.dim, args.latency_ms / 1000, args.tokens))
+    print(f"Fake Ollama listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
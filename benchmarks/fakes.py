@@ -0,0 +1,83 @@
+"""
+Deterministic in-process stand-ins for the Ollama embedding model and LLM.
+
+HashingEmbeddings maps texts to unit vectors by hashing their words into the
+vector dimensions, so texts that share words end up close together, like real
+embeddings, and the same text always gets the same vector. FakeLLM streams a
+fixed number of tokens with an optional per-token delay.
+"""
+from typing import Any, Iterator, List, Optional
+import re
+import time
+import zlib
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag-of-words feature hashing into dim dimensions, L2-normalized."""
+
+    def __init__(self, dim: int = 768, latency_ms: float = 0.0):
+        """
+        Args:
+            dim (int): Vector dimension.
+            latency_ms (float): Simulated server time per embedding call.
+        """
+        self.dim = dim
+        self.latency = latency_ms / 1000.0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in WORD_PATTERN.findall(text.lower())),
+                             dtype=np.uint64)
+        if len(hashes):
+            signs = np.where(hashes & 1, 1.0, -1.0).astype(np.float32)
+            np.add.at(vector, (hashes >> 1) % self.dim, signs)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[zlib.crc32(text.encode("utf-8")) % self.dim] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeLLM(LLM):
+    """Streams num_tokens pseudo tokens derived from the prompt."""
+
+    num_tokens: int = 64
+    token_latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def _tokens(self, prompt: str) -> Iterator[str]:
+        seed = zlib.crc32(prompt.encode("utf-8"))
+        for i in range(self.num_tokens):
+            if self.token_latency_ms:
+                time.sleep(self.token_latency_ms / 1000.0)
+            yield f" tok{(seed + i) % 997}"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        return "".join(self._tokens(prompt))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        for token in self._tokens(prompt):
+            yield GenerationChunk(text=token)
@@ -0,0 +1,56 @@
+"""
+Compare FAISS index specs on recall@k against exact search and on query latency.
+
+Uses the vectors of a saved flat vector store, or synthetic vectors:
+    python benchmarks/index_recall.py --vector-store ./vector_store
+    python benchmarks/index_recall.py --synthetic 200000 --dim 768 \
+        --spec Flat --spec IVF,Flat --spec IVF,PQ32 --spec HNSW32 --nprobe 16
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from index_factory import build_index, evaluate_index, set_search_params  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vector-store", help="Directory holding a flat index.faiss")
+    parser.add_argument("--synthetic", type=int, default=100_000, help="Number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--spec", action="append", help="Index spec to evaluate (repeatable)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--ef-search", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.vector_store:
+        flat = faiss.read_index(os.path.join(args.vector_store, "index.faiss"))
+        vectors = flat.reconstruct_n(0, flat.ntotal)
+    else:
+        # Clustered data resembles real embeddings better than uniform noise
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((256, args.dim)).astype(np.float32)
+        vectors = centers[rng.integers(0, 256, args.synthetic)] + 0.3 * rng.standard_normal((args.synthetic, args.dim)).astype(np.float32)
+
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}")
+    for spec in args.spec or ["Flat", "IVF,Flat", "IVF,PQ16", "HNSW32"]:
+        started = time.perf_counter()
+        index = build_index(spec, vectors)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - started
+        set_search_params(index, args.nprobe, args.ef_search)
+        stats = evaluate_index(index, vectors, k=args.k)
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        print(f"{spec:<16} build {build_seconds:7.2f}s  size {size_mb:8.1f}MB  "
+              f"recall@{args.k} {stats[f'recall_at_{args.k}']:.3f}  {stats['query_ms']:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
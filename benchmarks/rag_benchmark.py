@@ -0,0 +1,393 @@
+"""
+End-to-end benchmark of ingestion and question answering, without Ollama.
+
+Drives RAGModel (and optionally the FastAPI app over HTTP) with the deterministic
+stand-ins from benchmarks/fakes.py, on the sample documents or on a synthetic
+corpus of roughly --chunks chunks, and writes the results as JSON:
+
+    python benchmarks/rag_benchmark.py --corpus sample --output results/sample.json
+    python benchmarks/rag_benchmark.py --chunks 100000 --index-spec IVF,Flat \
+        --concurrency 8 --queries 2000 --output results/ivf-100k.json
+    python benchmarks/rag_benchmark.py --chunks 100000 --target api --baseline results/ivf-100k.json
+
+Reported: ingestion chunks/sec and per-stage seconds, index build time, cold
+load time, peak RSS, and query latency p50/p95/p99 and throughput at the given
+concurrency. With --baseline, each metric is printed next to the earlier run.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "backend"))
+
+from fakes import FakeLLM, HashingEmbeddings  # noqa: E402
+from model import RAGModel  # noqa: E402
+
+CHUNKS_PER_FILE = 100
+
+
+def peak_rss_mb() -> dict:
+    """Peak resident set size of this process and of its (loader) children so far."""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 / 1024 if sys.platform != "darwin" else 1 / (1024 * 1024)
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {}
+    values = np.asarray(samples) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+        "max_ms": float(values.max()),
+    }
+
+
+def make_vocabulary(rng: np.random.Generator, size: int) -> list:
+    syllables = ["ka", "lo", "mi", "net", "sys", "ter", "ux", "dat", "ron", "ve", "pi", "qu", "zen", "or", "al"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables, size=rng.integers(2, 5))))
+    return sorted(words)
+
+
+def write_synthetic_corpus(data_dir: str, chunks: int, seed: int = 0) -> list:
+    """
+    Write text files of roughly one 500-character chunk per paragraph.
+
+    Word frequencies follow a Zipf distribution, each file leans towards its own
+    topic words, and every paragraph carries an error code and a host name, so
+    both vector and keyword retrieval have realistic work to do.
+
+    Returns:
+        list: Sample questions drawn from the corpus.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(rng, 20_000)
+    questions = []
+    n_files = max(1, -(-chunks // CHUNKS_PER_FILE))
+    for f in range(n_files):
+        topic = rng.choice(len(vocabulary), size=50, replace=False)
+        paragraphs = []
+        for p in range(min(CHUNKS_PER_FILE, chunks - f * CHUNKS_PER_FILE)):
+            common = (rng.zipf(1.3, size=50) - 1) % len(vocabulary)
+            ids = np.concatenate([common, rng.choice(topic, size=25)])
+            rng.shuffle(ids)
+            words = [vocabulary[i] for i in ids]
+            code = f"ERR-{f}-{p}"
+            paragraphs.append(f"{code} on host-{f % 97}: " + " ".join(words)[:420] + ".")
+            if rng.random() < 0.01:
+                questions.append(" ".join(rng.choice(words, size=4)) + f" {code}?")
+        with open(os.path.join(data_dir, f"doc_{f:06d}.txt"), "w", encoding="utf-8") as out:
+            out.write("\n\n".join(paragraphs))
+    return questions
+
+
+def sample_questions(data_dir: str, seed: int = 0) -> list:
+    """Questions built from word sequences of the documents in data_dir."""
+    rng = np.random.default_rng(seed)
+    questions = []
+    for root, _, files in os.walk(data_dir):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "r", encoding="utf-8", errors="ignore") as f:
+                words = f.read().split()
+            for _ in range(min(20, len(words) // 10)):
+                start = rng.integers(0, len(words) - 6)
+                questions.append(" ".join(words[start:start + 6]) + "?")
+    return questions
+
+
+def make_model(args, data_dir: str, vector_store_path: str, **kwargs) -> RAGModel:
+    return RAGModel(
+        data_dir=data_dir,
+        vector_store_path=vector_store_path,
+        index_spec=args.index_spec,
+        vector_storage=args.vector_storage,
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+        loader_workers=args.loader_workers,
+        embed_batch_size=args.embed_batch_size,
+        embed_max_in_flight=args.embed_max_in_flight,
+        answer_cache_size=args.answer_cache_size,
+        query_batch_window_ms=args.query_batch_window_ms,
+        query_batch_size=args.query_batch_size,
+        chunk_tokens=args.chunk_tokens,
+        embeddings=HashingEmbeddings(dim=args.dim, latency_ms=args.embed_latency_ms),
+        # Hashed bag-of-words vectors score far below a real embedding model; keep every question answered
+        rerank_min_score=0.0,
+        llm=FakeLLM(num_tokens=args.llm_tokens, token_latency_ms=args.token_latency_ms),
+        **kwargs,
+    )
+
+
+def bench_ingest(args, data_dir: str, vector_store_path: str) -> dict:
+    model = make_model(args, data_dir, vector_store_path)
+    started = time.perf_counter()
+    report = model.load_and_process_documents()
+    seconds = time.perf_counter() - started
+    chunks = model.vector_store.index.ntotal if model.vector_store else 0
+    timings = report.get("timings", {})
+    return {
+        "files": report.get("added", 0),
+        "chunks": chunks,
+        "seconds": seconds,
+        "chunks_per_sec": chunks / seconds if seconds > 0 else 0.0,
+        "index_build_seconds": timings.get("index", 0.0),
+        "stages": timings,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_load(args, data_dir: str, vector_store_path: str) -> tuple:
+    """Time a cold start on the saved index, as the API does on restart."""
+    model = make_model(args, data_dir, vector_store_path)
+    started = time.perf_counter()
+    current = model.is_index_current()
+    model.load_vector_store(mmap=True)
+    model.initialize_qa_chain()
+    return model, {"seconds": time.perf_counter() - started, "index_current": current}
+
+
+def summarize_queries(latencies: list, stage_timings: list, errors: int, seconds: float, concurrency: int) -> dict:
+    stages = {}
+    for stage in sorted({s for t in stage_timings for s in t}):
+        stages[stage] = percentiles([t[stage] for t in stage_timings if stage in t])
+    return {
+        "queries": len(latencies) + errors,
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": seconds,
+        "qps": len(latencies) / seconds if seconds > 0 else 0.0,
+        "latency": percentiles(latencies),
+        "stages": stages,
+    }
+
+
+def bench_queries_model(model: RAGModel, questions: list, concurrency: int) -> dict:
+    def ask(question):
+        started = time.perf_counter()
+        result = model.get_answer(question)
+        return time.perf_counter() - started, result
+
+    latencies, stage_timings, errors = [], [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, result in pool.map(ask, questions):
+            if result["status"] != "success":
+                errors += 1
+                continue
+            latencies.append(latency)
+            stage_timings.append(result.get("timings", {}))
+    return summarize_queries(latencies, stage_timings, errors, time.perf_counter() - started, concurrency)
+
+
+def bench_queries_api(args, data_dir: str, vector_store_path: str, questions: list, concurrency: int) -> dict:
+    """
+    Serve the FastAPI app with uvicorn and query it over HTTP.
+
+    The app indexes the corpus per collection on startup; the embedding cache
+    filled by the ingestion benchmark makes that cheap.
+    """
+    import httpx
+    import uvicorn
+    import api
+    from collection_manager import CollectionManager
+
+    api.collections = CollectionManager(
+        data_dir, vector_store_path,
+        lambda **kwargs: make_model(args, **kwargs),
+        max_loaded=api.collections.max_loaded,
+    )
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{port}"
+
+    async def run() -> dict:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=300.0, limits=limits) as client:
+            while True:
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies, stage_timings = [], []
+            failures = {}
+
+            async def ask(question):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post("/ask", json={"text": question, "include_timings": True})
+                    latency = time.perf_counter() - started
+                if response.status_code == 200 and response.json()["status"] == "success":
+                    latencies.append(latency)
+                    stage_timings.append(response.json().get("timings") or {})
+                else:
+                    failures[response.status_code] = failures.get(response.status_code, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(ask(q) for q in questions))
+            result = summarize_queries(latencies, stage_timings, sum(failures.values()),
+                                       time.perf_counter() - started, concurrency)
+            result["failures_by_status"] = {str(k): v for k, v in failures.items()}
+            return result
+
+    try:
+        return asyncio.run(run())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    current, previous = flatten(results["results"]), flatten(baseline["results"])
+    print(f"\n{'metric':<40} {'baseline':>14} {'current':>14} {'change':>9}")
+    for key in sorted(current.keys() & previous.keys()):
+        before, after = previous[key], current[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else ""
+        print(f"{key:<40} {before:14.3f} {after:14.3f} {change:>9}")
+
+
+def environment() -> dict:
+    import faiss
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "faiss": getattr(faiss, "__version__", None),
+        "git_commit": commit,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", choices=["sample", "synthetic"], default="synthetic",
+                        help="The documents/ folder or a generated corpus of --chunks chunks")
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target", choices=["model", "api"], default="model",
+                        help="Query RAGModel directly or the FastAPI app over HTTP")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--index-spec", default="Flat")
+    parser.add_argument("--vector-storage", choices=["float32", "fp16", "int8"], default="float32")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--loader-workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--embed-batch-size", type=int, default=32)
+    parser.add_argument("--embed-max-in-flight", type=int, default=4)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated time per embedding call")
+    parser.add_argument("--llm-tokens", type=int, default=64, help="Tokens generated per answer")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Simulated time per generated token")
+    parser.add_argument("--query-batch-window-ms", type=float, default=0.0,
+                        help="Micro-batching window for question embedding and index search, 0 disables it")
+    parser.add_argument("--query-batch-size", type=int, default=32)
+    parser.add_argument("--chunk-tokens", type=int, default=128,
+                        help="Chunk size; the default keeps one synthetic paragraph per chunk")
+    parser.add_argument("--answer-cache-size", type=int, default=0, help="0 measures every query end to end")
+    parser.add_argument("--work-dir", help="Keep the corpus and index here instead of a temporary directory")
+    parser.add_argument("--output", default="rag_benchmark.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag-benchmark-")
+    data_dir = os.path.join(work_dir, "documents")
+    vector_store_path = os.path.join(work_dir, "vector_store")
+    shutil.rmtree(vector_store_path, ignore_errors=True)
+    # The API target builds its own RAGModel on import; keep it inside the work directory
+    os.environ.setdefault("DOCUMENTS_DIR", data_dir)
+    os.environ.setdefault("VECTOR_STORE_PATH", vector_store_path)
+
+    try:
+        if args.corpus == "sample":
+            shutil.rmtree(data_dir, ignore_errors=True)
+            shutil.copytree(os.path.join(REPO_DIR, "documents"), data_dir)
+            questions = sample_questions(data_dir, args.seed)
+        else:
+            shutil.rmtree(data_dir, ignore_errors=True)
+            os.makedirs(data_dir)
+            started = time.perf_counter()
+            questions = write_synthetic_corpus(data_dir, args.chunks, args.seed)
+            print(f"Generated {args.chunks} chunks in {time.perf_counter() - started:.1f}s")
+        questions = questions or ["What is this about?"]
+        questions = [questions[i % len(questions)] for i in range(args.queries)]
+
+        results = {"ingest": bench_ingest(args, data_dir, vector_store_path)}
+        print(f"Ingest: {results['ingest']['chunks']} chunks in {results['ingest']['seconds']:.1f}s "
+              f"({results['ingest']['chunks_per_sec']:.0f} chunks/sec)")
+        model, results["load"] = bench_load(args, data_dir, vector_store_path)
+        print(f"Cold load: {results['load']['seconds']:.2f}s")
+
+        if args.target == "api":
+            results["query"] = bench_queries_api(args, data_dir, vector_store_path, questions, args.concurrency)
+        else:
+            results["query"] = bench_queries_model(model, questions, args.concurrency)
+        results["peak_rss_mb"] = peak_rss_mb()
+        latency = results["query"]["latency"]
+        print(f"Queries: {results['query']['qps']:.1f}/s at concurrency {args.concurrency}, "
+              f"p50 {latency.get('p50_ms', 0):.1f}ms p95 {latency.get('p95_ms', 0):.1f}ms "
+              f"p99 {latency.get('p99_ms', 0):.1f}ms, {results['query']['errors']} errors")
+        print(f"Peak RSS: {results['peak_rss_mb']['self']:.0f}MB")
+
+        output = {"config": vars(args), "environment": environment(), "results": results}
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"Results written to {args.output}")
+
+        if args.baseline:
+            compare(output, args.baseline)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
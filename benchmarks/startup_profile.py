@@ -0,0 +1,265 @@
+"""
+Profile how long a backend replica takes to start serving, and where the time goes.
+
+Builds an index over a synthetic corpus, then starts the API with uvicorn in
+fresh processes as a query replica (ROLE=query), the way a new pod comes up,
+against benchmarks/fake_ollama_server.py:
+
+    python benchmarks/startup_profile.py --output results/startup.json
+    python benchmarks/startup_profile.py --baseline results/startup.json --max-regression 0.2
+
+Reported, as the median over --runs starts: seconds until the port answers,
+until /ready returns 200, and until the first question is answered (which
+includes creating the Ollama clients). One more start runs under
+python -X importtime and reports the import time of the api module and of each
+package imported before the replica was ready. Modules that should only be
+imported once ingestion runs or a question arrives (DEFERRED_MODULES) are
+reported if a replica loads them anyway.
+
+With --baseline, each metric is printed next to the earlier run, and the script
+exits with status 1 if a startup time grew by more than --max-regression or a
+deferred module is imported at startup.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+BACKEND_DIR = os.path.join(REPO_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from fakes import FakeLLM, HashingEmbeddings  # noqa: E402
+from collection_manager import CollectionManager, DEFAULT_COLLECTION  # noqa: E402
+from model import RAGModel  # noqa: E402
+from rag_benchmark import environment, flatten, write_synthetic_corpus  # noqa: E402
+
+# Imported only by ingestion or the first question; a replica loading a published index needs none of them
+DEFERRED_MODULES = (
+    "langchain_community.document_loaders.pdf",
+    "langchain_community.document_loaders.text",
+    "langchain_community.document_loaders.unstructured",
+    "langchain_community.embeddings.ollama",
+    "langchain_community.llms.ollama",
+)
+# Metrics gated by --max-regression
+STARTUP_METRICS = ("api_import_ms", "listening_seconds", "ready_seconds", "first_answer_seconds")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_index(args, data_dir: str, vector_store_path: str) -> int:
+    """Index the corpus into the default collection, as the indexer would publish it."""
+    collections = CollectionManager(
+        data_dir, vector_store_path,
+        lambda **kwargs: RAGModel(embeddings=HashingEmbeddings(dim=args.dim), llm=FakeLLM(),
+                                  chunk_tokens=args.chunk_tokens, **kwargs),
+    )
+    collections.ingest(DEFAULT_COLLECTION)
+    return collections.get(DEFAULT_COLLECTION).vector_store.index.ntotal
+
+
+def replica_env(work_dir: str, ollama_url: str) -> dict:
+    return dict(
+        os.environ,
+        ROLE="query",
+        OLLAMA_URL=ollama_url,
+        DOCUMENTS_DIR=os.path.join(work_dir, "documents"),
+        VECTOR_STORE_PATH=os.path.join(work_dir, "vector_store"),
+        INDEX_POLL_SECONDS="60",
+    )
+
+
+def start_replica(args, work_dir: str, ollama_url: str, importtime: bool = False) -> tuple:
+    """Start one query replica; return its process, URL and the start time."""
+    port = free_port()
+    # Imported with an import statement rather than by uvicorn's importer, which -X importtime does not see
+    serve = f"import api, uvicorn; uvicorn.run(api.app, host='127.0.0.1', port={port}, log_level='warning')"
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", serve]
+    stderr = open(os.path.join(work_dir, "importtime.log"), "w") if importtime else subprocess.DEVNULL
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=replica_env(work_dir, ollama_url),
+                               stdout=subprocess.DEVNULL, stderr=stderr)
+    if importtime:
+        stderr.close()
+    return process, f"http://127.0.0.1:{port}", started
+
+
+def wait_for(client: httpx.Client, process: subprocess.Popen, path: str, timeout: float,
+             status: Optional[int] = None) -> None:
+    """Poll path until it answers, with the given status if one is set."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Replica exited with status {process.returncode}")
+        try:
+            response = client.get(path)
+            if status is None or response.status_code == status:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{path} did not answer within {timeout:.0f}s")
+
+
+def measure_start(args, work_dir: str, ollama_url: str, importtime: bool = False) -> dict:
+    """
+    Start a replica, time it until it is listening, ready and has answered a
+    question, then stop it. Under importtime it is stopped once ready, so the log
+    only holds the imports of startup.
+    """
+    process, base_url, started = start_replica(args, work_dir, ollama_url, importtime)
+    timings = {}
+    try:
+        with httpx.Client(base_url=base_url, timeout=args.timeout) as client:
+            wait_for(client, process, "/metrics", args.timeout)
+            timings["listening_seconds"] = time.perf_counter() - started
+            wait_for(client, process, "/ready", args.timeout, status=200)
+            timings["ready_seconds"] = time.perf_counter() - started
+            if not importtime:
+                response = client.post("/ask", json={"text": "What is this about?"})
+                response.raise_for_status()
+                if response.json()["status"] != "success":
+                    raise RuntimeError(f"First question failed: {response.json()['answer']}")
+                timings["first_answer_seconds"] = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return timings
+
+
+def parse_importtime(path: str, top: int) -> dict:
+    """Import time of the api module and of the costliest packages."""
+    self_us, api_us, imported = {}, 0, 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            own, cumulative, name = line[len("import time:"):].split("|", 2)
+            own, cumulative, name = int(own), int(cumulative), name.strip()
+            imported += 1
+            if name == "api":
+                api_us = cumulative
+            package = name.split(".")[0]
+            self_us[package] = self_us.get(package, 0) + own
+    packages = sorted(self_us.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "api_import_ms": api_us / 1000,
+        "modules_imported": imported,
+        "packages_ms": {name: us / 1000 for name, us in packages},
+    }
+
+
+def deferred_imports(work_dir: str, ollama_url: str) -> list:
+    """
+    Deferred modules loaded by the time a replica is ready. Read from sys.modules,
+    since -X importtime misses modules LangChain loads lazily through importlib.
+    """
+    check = ("import json, sys, api; api.initialize_replica(); "
+             f"print(json.dumps([m for m in {list(DEFERRED_MODULES)!r} if m in sys.modules]))")
+    child = subprocess.run([sys.executable, "-c", check], cwd=BACKEND_DIR, env=replica_env(work_dir, ollama_url),
+                           capture_output=True, text=True, check=True)
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline_path: str, max_regression: float) -> list:
+    """Print results next to the baseline; return the startup metrics that regressed."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    current, previous = flatten(results["results"]), flatten(baseline["results"])
+    print(f"\n{'metric':<40} {'baseline':>14} {'current':>14} {'change':>9}")
+    regressed = []
+    for key in sorted(current.keys() & previous.keys()):
+        before, after = previous[key], current[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else ""
+        print(f"{key:<40} {before:14.3f} {after:14.3f} {change:>9}")
+        if key in STARTUP_METRICS and before and (after - before) / before > max_regression:
+            regressed.append(key)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2_000)
+    parser.add_argument("--chunk-tokens", type=int, default=128)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--runs", type=int, default=5, help="Replica starts timed; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="Packages listed by import time")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--work-dir", help="Keep the corpus and index here instead of a temporary directory")
+    parser.add_argument("--output", default="startup_profile.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Relative growth of a startup time over the baseline that fails the run")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="startup-profile-")
+    data_dir = os.path.join(work_dir, "documents")
+    ollama = None
+    try:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        shutil.rmtree(os.path.join(work_dir, "vector_store"), ignore_errors=True)
+        os.makedirs(data_dir)
+        write_synthetic_corpus(data_dir, args.chunks)
+        chunks = build_index(args, data_dir, os.path.join(work_dir, "vector_store"))
+        print(f"Indexed {chunks} chunks")
+
+        ollama_port = free_port()
+        ollama = subprocess.Popen(
+            [sys.executable, os.path.join(BENCHMARKS_DIR, "fake_ollama_server.py"),
+             "--port", str(ollama_port), "--dim", str(args.dim)],
+            stdout=subprocess.DEVNULL,
+        )
+        ollama_url = f"http://127.0.0.1:{ollama_port}"
+
+        runs = [measure_start(args, work_dir, ollama_url) for _ in range(args.runs)]
+        results = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        measure_start(args, work_dir, ollama_url, importtime=True)
+        results.update(parse_importtime(os.path.join(work_dir, "importtime.log"), args.top))
+        results["deferred_imported"] = deferred_imports(work_dir, ollama_url)
+
+        print(f"Listening after {results['listening_seconds']:.2f}s, ready after {results['ready_seconds']:.2f}s, "
+              f"first answer after {results['first_answer_seconds']:.2f}s (median of {args.runs})")
+        print(f"import api: {results['api_import_ms']:.0f}ms, {results['modules_imported']} modules imported by ready")
+        for name, ms in results["packages_ms"].items():
+            print(f"  {name:<32} {ms:9.1f}ms")
+        if results["deferred_imported"]:
+            print(f"Imported before they were needed: {', '.join(results['deferred_imported'])}")
+
+        output = {"config": vars(args), "environment": environment(), "results": results}
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"Results written to {args.output}")
+
+        failed = bool(results["deferred_imported"])
+        if args.baseline:
+            regressed = compare(output, args.baseline, args.max_regression)
+            if regressed:
+                print(f"Regressed by more than {args.max_regression:.0%}: {', '.join(regressed)}")
+            failed = failed or bool(regressed)
+        if failed:
+            sys.exit(1)
+    finally:
+        if ollama is not None:
+            ollama.terminate()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Compare the on-disk formats of the vector store on size, load time, RSS and recall.
+
+Builds one index per --storage encoding over the same synthetic corpus (embedded
+once, through the shared embedding cache), then loads each in a fresh process
+and runs --queries vector searches:
+
+    python benchmarks/vector_storage.py --chunks 100000
+    python benchmarks/vector_storage.py --chunks 200000 --storage float32 --storage int8 --work-dir /tmp/vs
+
+"float32/pickle" is the format saved by earlier releases, written here from the
+float32 index: the FAISS index read into RAM plus the unpickled LangChain
+docstore. The other rows memory-map the index and the chunk store. Every row
+includes loading the BM25 index. RSS is split into anonymous memory, private
+to each replica, and file-backed pages, which replicas on the same node share
+through the page cache. Recall@k is measured against the float32/pickle results.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "backend"))
+
+from fakes import FakeLLM, HashingEmbeddings  # noqa: E402
+from bm25 import BM25Index  # noqa: E402
+from model import RAGModel  # noqa: E402
+from rag_benchmark import write_synthetic_corpus  # noqa: E402
+
+
+def rss_mb() -> dict:
+    """Anonymous and file-backed resident memory of this process (Linux only)."""
+    usage = {}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("RssAnon", "RssFile"):
+                    usage[key[3:].lower()] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return usage
+
+
+def make_model(args, data_dir: str, vector_store_path: str, storage: str) -> RAGModel:
+    return RAGModel(
+        data_dir=data_dir,
+        vector_store_path=vector_store_path,
+        index_spec=args.index_spec,
+        vector_storage=storage,
+        embeddings=HashingEmbeddings(dim=args.dim),
+        llm=FakeLLM(),
+        embedding_cache_path=os.path.join(args.work_dir, "embedding_cache.sqlite"),
+    )
+
+
+def measure(args) -> None:
+    """Child process: load one store, search it and print the measurements as JSON."""
+    storage, mode = args.measure
+    model = make_model(args, os.path.join(args.work_dir, "documents"),
+                       os.path.join(args.work_dir, "vector_store", storage), storage)
+    with open(os.path.join(args.work_dir, "questions.json"), "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    embeddings = [model.embeddings.embed_query(q) for q in questions]
+
+    before = rss_mb()
+    started = time.perf_counter()
+    if mode == "pickle":
+        # Our own file, written by main()
+        vector_store = FAISS.load_local(os.path.join(args.work_dir, "pickle"), model.embeddings,
+                                        allow_dangerous_deserialization=True)
+        BM25Index.load(model.snapshots.current_path())
+    else:
+        model.load_vector_store(mmap=True)
+        vector_store = model.vector_store
+    load_seconds = time.perf_counter() - started
+    loaded = rss_mb()
+
+    hits = []
+    started = time.perf_counter()
+    for embedding in embeddings:
+        docs = vector_store.similarity_search_by_vector(embedding, k=args.k)
+        hits.append([doc.metadata.get("chunk_id") for doc in docs])
+    query_ms = 1000 * (time.perf_counter() - started) / max(1, len(embeddings))
+    searched = rss_mb()
+
+    print(json.dumps({
+        "load_seconds": load_seconds,
+        "query_ms": query_ms,
+        "rss_after_load_mb": {k: loaded[k] - before[k] for k in loaded},
+        "rss_after_queries_mb": {k: searched[k] - before[k] for k in searched},
+        "hits": hits,
+    }))
+
+
+def disk_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+               if name.startswith(("index.", "chunks."))) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--index-spec", default="Flat")
+    parser.add_argument("--storage", action="append", choices=["float32", "fp16", "int8"],
+                        help="Vector encoding to compare (repeatable)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--work-dir", help="Keep the corpus and indexes here instead of a temporary directory")
+    parser.add_argument("--measure", nargs=2, metavar=("STORAGE", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args)
+        return
+
+    keep = bool(args.work_dir)
+    args.work_dir = args.work_dir or tempfile.mkdtemp(prefix="vector-storage-")
+    data_dir = os.path.join(args.work_dir, "documents")
+    try:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        os.makedirs(data_dir)
+        questions = write_synthetic_corpus(data_dir, args.chunks) or ["What is this about?"]
+        with open(os.path.join(args.work_dir, "questions.json"), "w", encoding="utf-8") as f:
+            json.dump([questions[i % len(questions)] for i in range(args.queries)], f)
+
+        storages = args.storage or ["float32", "fp16", "int8"]
+        runs = []
+        for storage in dict.fromkeys(["float32"] + storages):
+            vector_store_path = os.path.join(args.work_dir, "vector_store", storage)
+            shutil.rmtree(vector_store_path, ignore_errors=True)
+            model = make_model(args, data_dir, vector_store_path, storage)
+            started = time.perf_counter()
+            model.load_and_process_documents()
+            print(f"Built {storage} index over {model.vector_store.index.ntotal} chunks "
+                  f"in {time.perf_counter() - started:.1f}s")
+            path = model.snapshots.current_path()
+            if storage == "float32":
+                pickle_path = os.path.join(args.work_dir, "pickle")
+                store = model.vector_store
+                FAISS(store.embeddings, faiss.read_index(os.path.join(path, "index.faiss")),
+                      InMemoryDocstore({chunk_id: store.docstore.search(chunk_id)
+                                        for chunk_id in store.index_to_docstore_id.values()}),
+                      dict(store.index_to_docstore_id)).save_local(pickle_path)
+                runs.append((storage, "pickle", pickle_path))
+            if storage in storages:
+                runs.append((storage, "mmap", path))
+
+        results, reference = {}, None
+        print(f"\n{'format':<16} {'disk MB':>9} {'load s':>8} {'anon MB':>9} {'file MB':>9} "
+              f"{'ms/query':>9} {'recall@' + str(args.k):>9}")
+        for storage, mode, path in runs:
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--measure", storage, mode,
+                 "--work-dir", args.work_dir, "--dim", str(args.dim), "--index-spec", args.index_spec,
+                 "--k", str(args.k)],
+                capture_output=True, text=True, check=True,
+            )
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            hits = result.pop("hits")
+            reference = reference or hits
+            found = sum(len(set(h) & set(r)) for h, r in zip(hits, reference))
+            result["recall_at_k"] = found / max(1, sum(len(r) for r in reference))
+            result["disk_mb"] = disk_mb(path)
+            results[f"{storage}/{mode}"] = result
+            rss = result["rss_after_queries_mb"]
+            print(f"{storage + '/' + mode:<16} {result['disk_mb']:9.1f} {result['load_seconds']:8.3f} "
+                  f"{rss.get('anon', 0):9.1f} {rss.get('file', 0):9.1f} {result['query_ms']:9.3f} "
+                  f"{result['recall_at_k']:9.3f}")
+    finally:
+        if not keep:
+            shutil.rmtree(args.work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,136 @@
 import chainlit as cl
-import requests
+from backend_client import BackendClient
+import asyncio
+import httpx
+import json
 import logging
 import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One pooled client shared by every chat session
+backend = BackendClient(
+    os.getenv("BACKEND_URL", "http://localhost:8000"),
+    max_connections=int(os.getenv("BACKEND_MAX_CONNECTIONS", "64")),
+    max_concurrency=int(os.getenv("BACKEND_MAX_CONCURRENCY", "32")),
+    timeout=float(os.getenv("BACKEND_TIMEOUT", "300")),
+    retries=int(os.getenv("BACKEND_RETRIES", "2")),
+)
+# Uploads go to the indexer when query replicas are deployed separately
+indexer = BackendClient(os.getenv("INDEXER_URL"), timeout=float(os.getenv("BACKEND_TIMEOUT", "300"))) \
+    if os.getenv("INDEXER_URL") else backend
+
 @cl.on_chat_start
 async def start():
     """Initialize the chat session."""
-    api_url = os.getenv("BACKEND_URL", "http://localhost:8000")
-    cl.user_session.set("api_url", api_url)
-
     await cl.Message(
         content="👋 Hello! I'm your company knowledge assistant. Ask me anything!",
         author="Assistant"
     ).send()
 
 
+@cl.on_chat_end
+async def end():
+    """Free the chat history kept by the backend."""
+    try:
+        await backend.request("DELETE", f"/sessions/{cl.context.session.id}")
+    except Exception as e:
+        logger.warning(f"Could not delete backend session: {str(e)}")
+
+
+def format_sources(sources) -> str:
+    """Render the unique source files of an answer."""
+    if not sources:
+        return "\n\nNo relevant documents were found."
+
+    unique_sources = set()  # Use a set to store unique sources
+    for source in sources:
+        unique_sources.add(source.get('source', 'Unknown Source'))
+
+    source_info = "\n\n**Sources:**\n"  # Add a separator and heading
+    for unique_source in unique_sources:
+        source_info += f"- {unique_source}\n"
+    return source_info
+
+
+async def upload_files(files) -> None:
+    """Send all attached files in one bulk upload and follow the indexing job."""
+    msg = cl.Message(content=f"Uploading {len(files)} file(s)...", author="Assistant")
+    await msg.send()
+
+    try:
+        payload = []
+        for file in files:
+            with open(file.path, "rb") as f:
+                payload.append(("files", (file.name, f.read())))
+        response = await indexer.post("/upload/bulk", files=payload)
+        job_id = response.json()["job_id"]
+
+        while True:
+            await asyncio.sleep(2)
+            job = (await indexer.get(f"/jobs/{job_id}")).json()
+            if job["status"] in ("completed", "failed"):
+                break
+
+            progress = job.get("progress", {})
+            eta = job.get("eta_seconds")
+            msg.content = (
+                f"Indexing {len(job['files'])} file(s): "
+                f"{progress.get('files_parsed', 0)}/{progress.get('files_total', '?')} parsed, "
+                f"{progress.get('chunks_embedded', 0)}/{progress.get('chunks_total', '?')} chunks embedded"
+                + (f", about {int(eta)}s left" if eta else "")
+            )
+            await msg.update()
+
+        if job["status"] == "failed":
+            msg.content = f"❌ Indexing failed: {job.get('error', 'Unknown error')}"
+        elif job.get("failed"):
+            msg.content = f"⚠️ Indexed {len(job['files']) - len(job['failed'])} file(s). Could not parse: " + \
+                ", ".join(job["failed"])
+        else:
+            msg.content = f"✅ {len(job['files'])} file(s) indexed! You can now ask questions about their contents."
+    except Exception as e:
+        msg.content = f"❌ Error uploading files: {str(e)}"
+    await msg.update()
+
+
 @cl.on_message
 async def main(message: cl.Message):
-    """Handle incoming chat messages."""
-    api_url = cl.user_session.get("api_url")
+    """Handle incoming chat messages, streaming the answer as it is generated."""
+    files = [element for element in (message.elements or []) if getattr(element, "path", None)]
+    if files:
+        await upload_files(files)
+        if not message.content.strip():
+            return
+
+    msg = cl.Message(content="", author="Assistant")
+    sources = []
 
     try:
-        response = requests.post(
-            f"{api_url}/ask",
-            json={"text": message.content}
-        )
-        response.raise_for_status()
-        result = response.json()
-
-        if result.get("status") == "success":
-            answer = result.get("answer", "I'm not sure how to respond to that.")
-            sources = result.get("sources", [])  # Get the list of sources
-            source_info = ""
-
-            if sources:
-                unique_sources = set()  # Use a set to store unique sources
-                for source in sources:
-                    unique_sources.add(source.get('source', 'Unknown Source'))
-
-                source_info = "\n\n**Sources:**\n"  # Add a separator and heading
-                for unique_source in unique_sources:
-                    source_info += f"- {unique_source}\n"
-            else:
-                source_info = "\n\nNo relevant documents were found."
-
-            full_answer = answer + source_info  # Combine answer and sources
-        else:
-            full_answer = f"❌ Error: {result.get('error', 'Unknown error')}"
+        # The backend keeps the chat history, so only the new message is sent
+        payload = {"text": message.content, "session_id": cl.context.session.id}
+        async with backend.stream("POST", "/ask/stream", json=payload) as response:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+
+                if event["type"] == "sources":
+                    sources = event.get("sources", [])  # Shown once the answer is complete
+                elif event["type"] == "token":
+                    await msg.stream_token(event["content"])
+                elif event["type"] == "done":
+                    await msg.stream_token(format_sources(sources))
+                elif event["type"] == "error":
+                    await msg.stream_token(f"❌ Error: {event.get('error', 'Unknown error')}")
 
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 429:
+            await msg.stream_token("⏳ The assistant is busy right now. Please try again in a moment.")
+        else:
+            await msg.stream_token(f"❌ Sorry, an error occurred: HTTP {e.response.status_code}")
     except Exception as e:
-        full_answer = f"❌ Sorry, an error occurred: {str(e)}"
+        await msg.stream_token(f"\n\n❌ Sorry, an error occurred: {str(e)}")
 
-    await cl.Message(
-        content=full_answer,
-        author="Assistant"
-    ).send()
+    await msg.send()
@@ -0,0 +1,118 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+import asyncio
+import logging
+import random
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Gateway and availability errors are worth retrying; other 5xx usually repeat
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class BackendClient:
+    """
+    Shared, pooled async HTTP client for the backend API.
+
+    One httpx.AsyncClient keeps connections to the backend alive across chat
+    sessions. A semaphore caps requests in flight so a burst of users queues in
+    the frontend instead of opening ever more connections. Failed connections and
+    5xx responses are retried with exponential backoff and jitter; a streamed
+    response is only retried before its first byte has been read.
+    """
+
+    def __init__(self, base_url: str, max_connections: int = 64, max_concurrency: int = 32,
+                 timeout: float = 300.0, connect_timeout: float = 10.0,
+                 retries: int = 2, backoff: float = 0.5):
+        """
+        Args:
+            base_url (str): Backend URL, e.g. http://backend:8000.
+            max_connections (int): Connections kept open to the backend.
+            max_concurrency (int): Requests in flight at once; others wait for a slot.
+            timeout (float): Seconds to wait for a response, or between streamed chunks.
+            connect_timeout (float): Seconds to wait for a connection.
+            retries (int): Retries after a connection error or a 5xx response.
+            backoff (float): Seconds before the first retry; doubled on every further retry.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_concurrency = max(1, max_concurrency)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the event loop that serves requests
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _wait(self, attempt: int, reason: str) -> None:
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        logger.warning(f"Backend request failed ({reason}); retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request and return the response once it is read.
+
+        Raises:
+            httpx.HTTPStatusError: If the backend answers with an error status.
+            httpx.TransportError: If the backend cannot be reached after all retries.
+        """
+        async with self.stream(method, path, **kwargs) as response:
+            await response.aread()
+            return response
+
+    async def get(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """
+        Send a request and yield the response for reading as it arrives.
+
+        The concurrency slot is held until the response has been consumed.
+
+        Raises:
+            httpx.HTTPStatusError: If the backend answers with an error status.
+            httpx.TransportError: If the backend cannot be reached after all retries.
+        """
+        client = self.client
+        async with self._slots:
+            for attempt in range(self.retries + 1):
+                last = attempt == self.retries
+                try:
+                    request = client.build_request(method, path, **kwargs)
+                    response = await client.send(request, stream=True)
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                    if last:
+                        raise
+                    await self._wait(attempt, type(e).__name__)
+                    continue
+
+                if response.status_code in RETRY_STATUSES and not last:
+                    await response.aclose()
+                    await self._wait(attempt, f"HTTP {response.status_code}")
+                    continue
+                try:
+                    if response.is_error:
+                        await response.aread()
+                        response.raise_for_status()
+                    yield response
+                finally:
+                    await response.aclose()
+                return
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()